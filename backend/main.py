@@ -3,8 +3,10 @@ RealBoost AI — FastAPI Backend
 """
 
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+import orjson
 import logging
 import sys
 import os
@@ -34,39 +36,76 @@ async def init_routers(app):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting RealBoost AI backend...")
+    # Each step fails on its own: a schema or pool problem must not leave
+    # the app serving only /health with no routers mounted
     try:
         from models.database import init_db
         await init_db()
-        await init_routers(app)
+    except Exception as e:
+        logger.error(f"Database init error: {e}")
+    from models.database import init_pg_pool
+    await init_pg_pool()
+    await init_routers(app)
+    try:
+        from routers.billing import start_webhook_workers
+        await start_webhook_workers()
+        from services.notification_service import start_alert_flusher
+        await start_alert_flusher()
     except Exception as e:
         logger.error(f"Startup error: {e}")
     yield
     logger.info("Shutting down...")
+    from routers.billing import stop_webhook_workers
+    await stop_webhook_workers()
+    from services.notification_service import stop_alert_flusher
+    await stop_alert_flusher()
+    from services.http_service import close_http
+    await close_http()
+    from models.database import close_db
+    await close_db()
 
 app = FastAPI(
     title="RealBoost AI API",
     description="AI-powered real estate marketing automation platform",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
+# One compiled regex match per request instead of scanning an origin list.
+# Override CORS_ORIGIN_REGEX for preview/staging frontends.
+CORS_ORIGIN_REGEX = os.getenv(
+    "CORS_ORIGIN_REGEX",
+    r"^https?://(localhost:(3000|5173)|(app|www)\.realboost\.ai)$",
+)
+
+
+class BrowserOnlyCORSMiddleware(CORSMiddleware):
+    """
+    CORS only matters for browsers, which always send Origin. Server-to-server
+    callers (Stripe, Meta, Twilio webhooks, uptime pings) skip the header parsing.
+    """
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not any(name == b"origin" for name, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
 app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "http://localhost:5173",
-        "https://app.realboost.ai",
-        "https://www.realboost.ai",
-        "*"  # Allow all for now during setup
-    ],
+    BrowserOnlyCORSMiddleware,
+    allow_origin_regex=CORS_ORIGIN_REGEX,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "service": "reagentamp-api", "version": "1.0.0"})
+
+
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "service": "reagentamp-api", "version": "1.0.0"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
 
 @app.get("/")
 async def root():
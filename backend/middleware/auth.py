@@ -6,78 +6,201 @@ JWT-based auth for multi-tenant agent sessions
 from fastapi import HTTPException, Depends, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from jose import JWTError, jwt
+from sqlalchemy.orm import make_transient_to_detached
+import jwt
+from jwt import PyJWK, PyJWTError
+from jwt.algorithms import HMACAlgorithm
+from jwt.utils import base64url_encode
 from passlib.context import CryptContext
-from datetime import datetime, timedelta
-from typing import Optional
+import bcrypt
+from datetime import datetime, timedelta, timezone
+from typing import Optional, NamedTuple
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import hashlib
+import orjson
+import time
+import uuid
 import os
 
-from models.database import Agent, get_db
+from models.database import Agent, SubscriptionStatus, get_db, fetch_agent_row
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY", "change-this-in-production-use-256-bit-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Built once so the per-request decode path does no setup work. The PyJWK
+# carries an already-prepared HMAC key, so decode skips prepare_key() per call.
+_SECRET_BYTES = SECRET_KEY.encode("utf-8")
+_VERIFY_KEY = PyJWK({"kty": "oct", "k": base64url_encode(_SECRET_BYTES).decode(), "alg": ALGORITHM})
+_VERIFIER_OPTS = {"algorithms": [ALGORITHM], "options": {"require": ["exp", "sub"]}}
+
+# Signing side: the JOSE header never changes and the HMAC key is prepared once,
+# so create_access_token only serializes the claims and signs.
+_SIGNER = HMACAlgorithm(HMACAlgorithm.SHA256)
+_SIGNING_KEY = _SIGNER.prepare_key(_SECRET_BYTES)
+_HEADER_SEGMENT = base64url_encode(orjson.dumps({"alg": ALGORITHM, "typ": "JWT"}))
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+_BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
+# Only used to verify hashes that aren't plain bcrypt (legacy schemes)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+# bcrypt is deliberately slow CPU work; run it off the event loop, at most one
+# hash per core at a time
+_BCRYPT_EXECUTOR = ThreadPoolExecutor(max_workers=os.cpu_count() or 2, thread_name_prefix="bcrypt")
 security = HTTPBearer()
 
+# Verified token payloads, keyed by a hash of the token (never the raw token).
+# Repeat requests inside the TTL window skip signature verification + JSON parsing.
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("JWT_CACHE_TTL_SECONDS", "5"))
+TOKEN_CACHE_MAX_SIZE = int(os.getenv("JWT_CACHE_MAX_SIZE", "10000"))
+_token_cache = TTLCache(maxsize=TOKEN_CACHE_MAX_SIZE, ttl=TOKEN_CACHE_TTL_SECONDS)
+_token_cache_lock = threading.Lock()
+
+# Column snapshots of recently authenticated agents, keyed by agent id.
+# Anything that changes an agent row must call invalidate_agent().
+AGENT_CACHE_TTL_SECONDS = int(os.getenv("AGENT_CACHE_TTL_SECONDS", "30"))
+AGENT_CACHE_MAX_SIZE = int(os.getenv("AGENT_CACHE_MAX_SIZE", "5000"))
+_agent_cache = TTLCache(maxsize=AGENT_CACHE_MAX_SIZE, ttl=AGENT_CACHE_TTL_SECONDS)
 
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
 
+def _hash_password_sync(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
-def verify_password(plain: str, hashed: str) -> bool:
+
+def _verify_password_sync(plain: str, hashed: str) -> bool:
+    if hashed.startswith(_BCRYPT_PREFIXES):
+        return bcrypt.checkpw(plain.encode(), hashed.encode())
     return pwd_context.verify(plain, hashed)
 
 
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_BCRYPT_EXECUTOR, _hash_password_sync, password)
+
+
+async def verify_password(plain: str, hashed: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_BCRYPT_EXECUTOR, _verify_password_sync, plain, hashed)
+
+
 def create_access_token(agent_id: str, email: str) -> str:
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    return jwt.encode(
-        {"sub": str(agent_id), "email": email, "exp": expire},
-        SECRET_KEY,
-        algorithm=ALGORITHM,
-    )
+    expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    claims = {"sub": str(agent_id), "email": email, "exp": int(expire.timestamp())}
+    signing_input = _HEADER_SEGMENT + b"." + base64url_encode(orjson.dumps(claims))
+    signature = base64url_encode(_SIGNER.sign(signing_input, _SIGNING_KEY))
+    return (signing_input + b"." + signature).decode()
+
+
+def _token_cache_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()[:16]
 
 
 def decode_token(token: str) -> dict:
+    key = _token_cache_key(token)
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    if cached is not None and cached.get("exp", 0) > time.time():
+        return cached
+
     try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
+        payload = jwt.decode(token, _VERIFY_KEY, **_VERIFIER_OPTS)
+    except PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired token",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    with _token_cache_lock:
+        _token_cache[key] = payload
+    return payload
 
-async def get_current_agent(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_db),
-) -> Agent:
+
+class AuthedAgent(NamedTuple):
+    """The agent fields auth checks need, for endpoints that only scope queries by agent"""
+    id: uuid.UUID
+    subscription_status: SubscriptionStatus
+    is_active: bool
+
+
+async def _load_agent_snapshot(credentials: HTTPAuthorizationCredentials) -> dict:
     payload = decode_token(credentials.credentials)
     agent_id = payload.get("sub")
     if not agent_id:
         raise HTTPException(status_code=401, detail="Invalid token payload")
 
-    result = await db.execute(select(Agent).where(Agent.id == agent_id, Agent.is_active == True))
-    agent = result.scalar_one_or_none()
-    if not agent:
-        raise HTTPException(status_code=401, detail="Agent not found or inactive")
+    try:
+        agent_uuid = uuid.UUID(agent_id)
+    except ValueError:
+        raise HTTPException(status_code=401, detail="Invalid token payload")
+
+    snapshot = _agent_cache.get(agent_uuid)
+    if snapshot is None:
+        snapshot = await fetch_agent_row(agent_uuid)
+        if not snapshot or not snapshot["is_active"]:
+            raise HTTPException(status_code=401, detail="Agent not found or inactive")
+        _agent_cache[agent_uuid] = snapshot
+    return snapshot
+
+
+async def get_current_agent(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: AsyncSession = Depends(get_db),
+) -> Agent:
+    snapshot = await _load_agent_snapshot(credentials)
+    return _attach_cached_agent(snapshot, db)
+
 
+async def get_authed_agent(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+) -> AuthedAgent:
+    """Like get_current_agent, but skips building and attaching an ORM instance"""
+    snapshot = await _load_agent_snapshot(credentials)
+    return AuthedAgent(snapshot["id"], snapshot["subscription_status"], snapshot["is_active"])
+
+
+def _attach_cached_agent(snapshot: dict, db: AsyncSession) -> Agent:
+    """Rebuild a persistent Agent from a column snapshot without an ORM SELECT"""
+    agent = db.identity_map.get(db.identity_key(Agent, snapshot["id"]))
+    if agent is not None:
+        return agent
+    agent = Agent(**snapshot)
+    make_transient_to_detached(agent)
+    db.add(agent)
     return agent
 
 
+def invalidate_agent(agent_id) -> None:
+    """Drop an agent from the auth cache after its row has been modified"""
+    if isinstance(agent_id, str):
+        agent_id = uuid.UUID(agent_id)
+    _agent_cache.pop(agent_id, None)
+
+
 async def verify_token(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> dict:
     return decode_token(credentials.credentials)
 
 
-def require_active_subscription(agent: Agent = Depends(get_current_agent)) -> Agent:
+def _check_subscription(agent) -> None:
     if agent.subscription_status not in ("active", "trialing"):
         raise HTTPException(
             status_code=402,
             detail="Active subscription required. Please update your billing at /billing.",
         )
+
+
+def require_active_subscription(agent: Agent = Depends(get_current_agent)) -> Agent:
+    _check_subscription(agent)
+    return agent
+
+
+def require_active_authed_agent(agent: AuthedAgent = Depends(get_authed_agent)) -> AuthedAgent:
+    _check_subscription(agent)
     return agent
@@ -12,20 +12,27 @@ STEP 4: Ads Router
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, and_, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import load_only
 from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timedelta
 from uuid import UUID
+from cachetools import TTLCache
+import asyncio
 import httpx
 import os
 import logging
 import hmac
 import hashlib
 
-from models.database import Agent, AdAccount, AdOptimizationLog, Lead, LeadSource, get_db
-from middleware.auth import get_current_agent, require_active_subscription
+from models.database import Agent, AdAccount, AdOptimizationLog, Lead, LeadSource, AsyncSessionLocal, get_db, get_db_ro
+from middleware.auth import require_active_subscription, AuthedAgent, get_authed_agent, require_active_authed_agent
 from services.ai_service import optimize_ad_budget
+from services.http_service import get_http
+from services.cache_service import CACHE_PREFIX, cache_get, cache_set, cache_delete, claim_once, invalidate_agent_responses
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -34,6 +41,55 @@ META_APP_ID = os.getenv("META_APP_ID")
 META_APP_SECRET = os.getenv("META_APP_SECRET")
 META_API_VERSION = "v19.0"
 META_BASE_URL = f"https://graph.facebook.com/{META_API_VERSION}"
+_META_SECRET_BYTES = (META_APP_SECRET or "").encode()
+_META_SIGNATURE_PREFIX = "sha256="
+_META_WEBHOOK_VERIFY_TOKEN = os.getenv("META_WEBHOOK_VERIFY_TOKEN", "").encode()
+
+PERFORMANCE_CACHE_TTL_SECONDS = 60
+META_AD_ACCOUNT_CACHE_TTL_SECONDS = 60 * 60 * 24
+META_LEAD_DEDUPE_TTL_SECONDS = 60 * 60 * 24
+
+# Geo-targeting built per (normalized location, radius); geocodes don't move
+_geo_targeting_cache = TTLCache(maxsize=10_000, ttl=60 * 60 * 24 * 30)
+PLATFORM_CACHE_MAX_AGE = timedelta(hours=1)
+
+_PERFORMANCE_COLUMNS = (
+    AdAccount.id,
+    AdAccount.platform,
+    AdAccount.is_connected,
+    AdAccount.monthly_budget,
+    AdAccount.cached_spend,
+    AdAccount.cached_leads,
+    AdAccount.cached_cpl,
+    AdAccount.cached_roas,
+    AdAccount.cache_updated_at,
+)
+
+# AdAccount columns safe and useful to list — never the OAuth tokens
+_ACCOUNT_SUMMARY_OPTIONS = load_only(
+    AdAccount.platform,
+    AdAccount.account_id,
+    AdAccount.is_connected,
+    AdAccount.monthly_budget,
+    AdAccount.cached_spend,
+    AdAccount.cached_leads,
+    AdAccount.cached_cpl,
+    AdAccount.cached_roas,
+    AdAccount.cache_updated_at,
+)
+
+# cache_updated_at is stored as naive UTC, so compare against the DB clock in UTC
+_NEEDS_REFRESH = and_(
+    AdAccount.is_connected.is_(True),
+    or_(
+        AdAccount.cache_updated_at.is_(None),
+        AdAccount.cache_updated_at < func.timezone("utc", func.now()) - PLATFORM_CACHE_MAX_AGE,
+    ),
+).label("needs_refresh")
+
+
+def _performance_cache_key(agent_id) -> str:
+    return f"{CACHE_PREFIX}:adperf:{agent_id}"
 
 
 # ── SCHEMAS ───────────────────────────────────────────────────────────────────
@@ -64,39 +120,53 @@ class CampaignCreate(BaseModel):
 
 @router.get("/performance")
 async def get_ad_performance(
-    agent: Agent = Depends(get_current_agent),
-    db: AsyncSession = Depends(get_db),
+    background_tasks: BackgroundTasks,
+    agent: AuthedAgent = Depends(get_authed_agent),
+    db: AsyncSession = Depends(get_db_ro),
 ):
-    """Aggregate performance across all connected platforms"""
-    result = await db.execute(select(AdAccount).where(AdAccount.agent_id == agent.id))
-    accounts = result.scalars().all()
+    """
+    Aggregate performance across all connected platforms.
+    Served from Redis when warm; stale platform data is refreshed in the
+    background so the dashboard never waits on the ad platform APIs.
+    """
+    cache_key = _performance_cache_key(agent.id)
+    cached_payload = await cache_get(cache_key)
+    if cached_payload is not None:
+        return cached_payload
+
+    # Totals ride along on every row as window sums, so Postgres does the aggregation
+    result = await db.execute(
+        select(
+            *_PERFORMANCE_COLUMNS,
+            _NEEDS_REFRESH,
+            func.coalesce(func.sum(AdAccount.cached_spend).over(), 0).label("total_spend"),
+            func.coalesce(func.sum(AdAccount.cached_leads).over(), 0).label("total_leads"),
+        ).where(AdAccount.agent_id == agent.id)
+    )
+    rows = result.all()
 
     platforms = []
-    for account in accounts:
-        # Refresh cache if stale (> 1 hour)
-        needs_refresh = (
-            not account.cache_updated_at or
-            datetime.utcnow() - account.cache_updated_at > timedelta(hours=1)
-        )
-        if needs_refresh and account.is_connected:
-            await _refresh_platform_cache(account, db)
+    stale_account_ids = []
+    for row in rows:
+        if row.needs_refresh:
+            stale_account_ids.append(row.id)
 
         platforms.append({
-            "platform": account.platform,
-            "is_connected": account.is_connected,
-            "monthly_budget": account.monthly_budget,
-            "spend": account.cached_spend,
-            "leads": account.cached_leads,
-            "cpl": account.cached_cpl,
-            "roas": account.cached_roas,
-            "cache_updated_at": account.cache_updated_at.isoformat() if account.cache_updated_at else None,
+            "platform": row.platform,
+            "is_connected": row.is_connected,
+            "monthly_budget": row.monthly_budget,
+            "spend": row.cached_spend,
+            "leads": row.cached_leads,
+            "cpl": row.cached_cpl,
+            "roas": row.cached_roas,
+            "cache_updated_at": row.cache_updated_at,
         })
 
     # Total stats
-    total_spend = sum(p["spend"] for p in platforms)
-    total_leads = sum(p["leads"] for p in platforms)
+    total_spend = rows[0].total_spend if rows else 0
+    total_leads = rows[0].total_leads if rows else 0
 
-    return {
+    payload = {
         "platforms": platforms,
         "totals": {
             "spend": total_spend,
@@ -105,17 +175,25 @@ async def get_ad_performance(
         },
     }
 
+    if stale_account_ids:
+        background_tasks.add_task(_refresh_stale_accounts, agent.id, stale_account_ids)
+    else:
+        await cache_set(cache_key, payload, PERFORMANCE_CACHE_TTL_SECONDS)
+    return payload
+
 
 @router.post("/optimize")
 async def run_ai_optimization(
-    agent: Agent = Depends(require_active_subscription),
+    agent: AuthedAgent = Depends(require_active_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
     """
     Run AI analysis on all platform data and get budget reallocation recommendation.
     Optionally auto-applies the recommendation.
     """
-    result = await db.execute(select(AdAccount).where(AdAccount.agent_id == agent.id))
+    result = await db.execute(
+        select(AdAccount).options(_ACCOUNT_SUMMARY_OPTIONS).where(AdAccount.agent_id == agent.id)
+    )
     accounts = result.scalars().all()
 
     if not accounts:
@@ -145,37 +223,34 @@ async def run_ai_optimization(
         projected_additional_leads=recommendation.get("projected_additional_leads"),
     )
     db.add(log)
+    # The uuid7 id default is only applied at flush; without it log_id would be null
+    await db.flush()
 
-    return {**recommendation, "log_id": str(log.id)}
+    return {**recommendation, "log_id": log.id}
 
 
 @router.post("/optimize/{log_id}/apply")
 async def apply_optimization(
     log_id: UUID,
-    agent: Agent = Depends(require_active_subscription),
+    agent: AuthedAgent = Depends(require_active_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
     """Apply an AI optimization recommendation to actual ad budgets"""
-    result = await db.execute(
-        select(AdOptimizationLog).where(
-            AdOptimizationLog.id == log_id,
-            AdOptimizationLog.agent_id == agent.id
-        )
-    )
-    log = result.scalar_one_or_none()
-    if not log:
+    log = await db.get(AdOptimizationLog, log_id)
+    if not log or log.agent_id != agent.id:
         raise HTTPException(status_code=404, detail="Optimization log not found")
 
-    # Update budgets
-    from_acct_result = await db.execute(
-        select(AdAccount).where(AdAccount.agent_id == agent.id, AdAccount.platform == log.from_platform)
-    )
-    to_acct_result = await db.execute(
-        select(AdAccount).where(AdAccount.agent_id == agent.id, AdAccount.platform == log.to_platform)
+    # Update budgets — both accounts in one round-trip
+    acct_result = await db.execute(
+        select(AdAccount).where(
+            AdAccount.agent_id == agent.id,
+            AdAccount.platform.in_((log.from_platform, log.to_platform)),
+        )
     )
+    accounts_by_platform = {a.platform: a for a in acct_result.scalars()}
 
-    from_acct = from_acct_result.scalar_one_or_none()
-    to_acct = to_acct_result.scalar_one_or_none()
+    from_acct = accounts_by_platform.get(log.from_platform)
+    to_acct = accounts_by_platform.get(log.to_platform)
 
     if from_acct and log.amount_shifted:
         from_acct.monthly_budget = max(0, from_acct.monthly_budget - log.amount_shifted)
@@ -184,6 +259,7 @@ async def apply_optimization(
 
     log.was_applied = True
     log.applied_at = datetime.utcnow()
+    await cache_delete(_performance_cache_key(agent.id))
 
     return {"status": "applied", "message": f"Shifted ${log.amount_shifted} from {log.from_platform} to {log.to_platform}"}
 
@@ -192,17 +268,19 @@ async def apply_optimization(
 
 @router.get("/accounts")
 async def list_ad_accounts(
-    agent: Agent = Depends(get_current_agent),
-    db: AsyncSession = Depends(get_db),
+    agent: AuthedAgent = Depends(get_authed_agent),
+    db: AsyncSession = Depends(get_db_ro),
 ):
-    result = await db.execute(select(AdAccount).where(AdAccount.agent_id == agent.id))
+    result = await db.execute(
+        select(AdAccount).options(_ACCOUNT_SUMMARY_OPTIONS).where(AdAccount.agent_id == agent.id)
+    )
     return result.scalars().all()
 
 
 @router.post("/accounts/connect")
 async def connect_ad_account(
     data: AdAccountConnect,
-    agent: Agent = Depends(require_active_subscription),
+    agent: AuthedAgent = Depends(require_active_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
     """Connect an ad platform account via OAuth token"""
@@ -229,7 +307,11 @@ async def connect_ad_account(
         if not verified:
             raise HTTPException(status_code=400, detail="Meta access token verification failed")
 
-    await db.flush()
+    try:
+        await db.flush()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="This ad account is already connected to another agent")
+    await cache_delete(_performance_cache_key(agent.id))
     return {"status": "connected", "platform": data.platform}
 
 
@@ -237,7 +319,7 @@ async def connect_ad_account(
 async def update_platform_budget(
     platform: str,
     data: BudgetUpdate,
-    agent: Agent = Depends(require_active_subscription),
+    agent: AuthedAgent = Depends(require_active_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
     result = await db.execute(
@@ -248,6 +330,7 @@ async def update_platform_budget(
         raise HTTPException(status_code=404, detail="Ad account not found")
 
     account.monthly_budget = data.monthly_budget
+    await cache_delete(_performance_cache_key(agent.id))
     return {"status": "updated", "platform": platform, "monthly_budget": data.monthly_budget}
 
 
@@ -268,61 +351,61 @@ async def create_meta_campaign(
         raise HTTPException(status_code=400, detail="Meta Ads account not connected")
 
     try:
-        async with httpx.AsyncClient() as client:
-            # Step 1: Create campaign
-            campaign_resp = await client.post(
-                f"{META_BASE_URL}/act_{account.account_id}/campaigns",
-                params={
-                    "access_token": account.access_token,
-                    "name": data.name,
-                    "objective": data.objective,
-                    "status": "PAUSED",  # Start paused for review
-                    "special_ad_categories": ["HOUSING"],  # Required for real estate
-                },
-            )
-            campaign_resp.raise_for_status()
-            campaign_id = campaign_resp.json()["id"]
-
-            # Step 2: Create ad set with targeting
-            daily_budget_cents = int(data.daily_budget * 100)
-            location_targeting = await _build_meta_location_targeting(
-                data.target_location or agent.location or "United States",
-                data.target_radius_miles,
-            )
-
-            adset_resp = await client.post(
-                f"{META_BASE_URL}/act_{account.account_id}/adsets",
-                params={
-                    "access_token": account.access_token,
-                    "campaign_id": campaign_id,
-                    "name": f"{data.name} - Ad Set",
-                    "daily_budget": daily_budget_cents,
-                    "billing_event": "IMPRESSIONS",
-                    "optimization_goal": "LEAD_GENERATION",
-                    "bid_strategy": "LOWEST_COST_WITHOUT_CAP",
-                    "targeting": {
-                        "geo_locations": location_targeting,
-                        "age_min": data.age_min,
-                        "age_max": data.age_max,
-                        "interests": [
-                            {"id": "6003020834693", "name": "Real estate"},
-                            {"id": "6003255229069", "name": "Home ownership"},
-                            {"id": "6003195624287", "name": "Property"},
-                        ],
-                    },
-                    "status": "PAUSED",
-                },
-            )
-            adset_resp.raise_for_status()
-            adset_id = adset_resp.json()["id"]
+        client = get_http()
+        # Step 1: Create campaign
+        campaign_resp = await client.post(
+            f"{META_BASE_URL}/act_{account.account_id}/campaigns",
+            params={
+                "access_token": account.access_token,
+                "name": data.name,
+                "objective": data.objective,
+                "status": "PAUSED",  # Start paused for review
+                "special_ad_categories": ["HOUSING"],  # Required for real estate
+            },
+        )
+        campaign_resp.raise_for_status()
+        campaign_id = campaign_resp.json()["id"]
+
+        # Step 2: Create ad set with targeting
+        daily_budget_cents = int(data.daily_budget * 100)
+        location_targeting = await _build_meta_location_targeting(
+            data.target_location or agent.location or "United States",
+            data.target_radius_miles,
+        )
 
-            logger.info(f"Created Meta campaign {campaign_id} for agent {agent.email}")
-            return {
-                "status": "created",
+        adset_resp = await client.post(
+            f"{META_BASE_URL}/act_{account.account_id}/adsets",
+            params={
+                "access_token": account.access_token,
                 "campaign_id": campaign_id,
-                "adset_id": adset_id,
-                "note": "Campaign created in PAUSED state — activate in Meta Ads Manager after review",
-            }
+                "name": f"{data.name} - Ad Set",
+                "daily_budget": daily_budget_cents,
+                "billing_event": "IMPRESSIONS",
+                "optimization_goal": "LEAD_GENERATION",
+                "bid_strategy": "LOWEST_COST_WITHOUT_CAP",
+                "targeting": {
+                    "geo_locations": location_targeting,
+                    "age_min": data.age_min,
+                    "age_max": data.age_max,
+                    "interests": [
+                        {"id": "6003020834693", "name": "Real estate"},
+                        {"id": "6003255229069", "name": "Home ownership"},
+                        {"id": "6003195624287", "name": "Property"},
+                    ],
+                },
+                "status": "PAUSED",
+            },
+        )
+        adset_resp.raise_for_status()
+        adset_id = adset_resp.json()["id"]
+
+        logger.info(f"Created Meta campaign {campaign_id} for agent {agent.email}")
+        return {
+            "status": "created",
+            "campaign_id": campaign_id,
+            "adset_id": adset_id,
+            "note": "Campaign created in PAUSED state — activate in Meta Ads Manager after review",
+        }
 
     except httpx.HTTPStatusError as e:
         logger.error(f"Meta API error: {e.response.text}")
@@ -334,7 +417,7 @@ async def create_meta_campaign(
 
 @router.get("/meta/performance")
 async def get_meta_performance(
-    agent: Agent = Depends(get_current_agent),
+    agent: AuthedAgent = Depends(get_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
     """Fetch real performance data from Meta Ads API"""
@@ -346,30 +429,32 @@ async def get_meta_performance(
         return {"error": "Meta not connected", "data": None}
 
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{META_BASE_URL}/act_{account.account_id}/insights",
-                params={
-                    "access_token": account.access_token,
-                    "fields": "spend,impressions,clicks,leads,actions,cost_per_action_type",
-                    "date_preset": "this_month",
-                    "level": "account",
-                },
-            )
-            resp.raise_for_status()
-            data = resp.json().get("data", [{}])[0]
+        client = get_http()
+        resp = await client.get(
+            f"{META_BASE_URL}/act_{account.account_id}/insights",
+            params={
+                "access_token": account.access_token,
+                # actions / cost_per_action_type are the bulk of the payload and unused
+                "fields": "spend,impressions,clicks,leads",
+                "date_preset": "this_month",
+                "level": "account",
+            },
+        )
+        resp.raise_for_status()
+        data = resp.json().get("data", [{}])[0]
 
-            spend = float(data.get("spend", 0))
-            leads = int(data.get("leads", 0))
-            cpl = round(spend / leads, 2) if leads > 0 else 0
+        spend = float(data.get("spend", 0))
+        leads = int(data.get("leads", 0))
+        cpl = round(spend / leads, 2) if leads > 0 else 0
 
-            # Update cache
-            account.cached_spend = spend
-            account.cached_leads = leads
-            account.cached_cpl = cpl
-            account.cache_updated_at = datetime.utcnow()
+        # Update cache
+        account.cached_spend = spend
+        account.cached_leads = leads
+        account.cached_cpl = cpl
+        account.cache_updated_at = datetime.utcnow()
+        await cache_delete(_performance_cache_key(agent.id))
 
-            return {"platform": "meta", "spend": spend, "leads": leads, "cpl": cpl, "raw": data}
+        return {"platform": "meta", "spend": spend, "leads": leads, "cpl": cpl, "raw": data}
 
     except Exception as e:
         logger.error(f"Meta performance fetch failed: {e}")
@@ -382,7 +467,6 @@ async def get_meta_performance(
 async def meta_lead_webhook(
     request: Request,
     background_tasks: BackgroundTasks,
-    db: AsyncSession = Depends(get_db),
 ):
     """
     Receives real-time lead notifications from Meta Lead Ads.
@@ -392,20 +476,19 @@ async def meta_lead_webhook(
     # Verify Meta signature
     body = await request.body()
     signature = request.headers.get("X-Hub-Signature-256", "")
-    expected = "sha256=" + hmac.new(
-        META_APP_SECRET.encode(), body, hashlib.sha256
-    ).hexdigest()
-
-    if not hmac.compare_digest(signature, expected):
+    if not _verify_meta_signature(body, signature):
         raise HTTPException(status_code=403, detail="Invalid Meta webhook signature")
 
     payload = await request.json()
 
-    for entry in payload.get("entry", []):
-        for change in entry.get("changes", []):
-            if change.get("field") == "leadgen":
-                lead_data = change.get("value", {})
-                background_tasks.add_task(_process_meta_lead, lead_data, db)
+    lead_batch = [
+        change.get("value", {})
+        for entry in payload.get("entry", [])
+        for change in entry.get("changes", [])
+        if change.get("field") == "leadgen"
+    ]
+    if lead_batch:
+        background_tasks.add_task(_process_meta_leads, lead_batch)
 
     return {"status": "ok"}
 
@@ -415,8 +498,9 @@ async def verify_meta_webhook(request: Request):
     """Meta webhook verification challenge"""
     params = request.query_params
     if (
+        _META_WEBHOOK_VERIFY_TOKEN and
         params.get("hub.mode") == "subscribe" and
-        params.get("hub.verify_token") == os.getenv("META_WEBHOOK_VERIFY_TOKEN")
+        hmac.compare_digest(params.get("hub.verify_token", "").encode(), _META_WEBHOOK_VERIFY_TOKEN)
     ):
         return int(params.get("hub.challenge", 0))
     raise HTTPException(status_code=403, detail="Verification failed")
@@ -426,8 +510,8 @@ async def verify_meta_webhook(request: Request):
 
 @router.get("/google/performance")
 async def get_google_performance(
-    agent: Agent = Depends(get_current_agent),
-    db: AsyncSession = Depends(get_db),
+    agent: AuthedAgent = Depends(get_authed_agent),
+    db: AsyncSession = Depends(get_db_ro),
 ):
     """
     Google Ads performance data.
@@ -452,7 +536,7 @@ async def get_google_performance(
 
 @router.get("/tiktok/performance")
 async def get_tiktok_performance(
-    agent: Agent = Depends(get_current_agent),
+    agent: AuthedAgent = Depends(get_authed_agent),
 ):
     """
     TikTok Ads performance.
@@ -478,7 +562,7 @@ async def get_tiktok_performance(
 
 @router.get("/waze/performance")
 async def get_waze_performance(
-    agent: Agent = Depends(get_current_agent),
+    agent: AuthedAgent = Depends(get_authed_agent),
 ):
     """
     Waze Ads (Branded Pins) performance.
@@ -500,88 +584,216 @@ async def get_waze_performance(
 
 # ── INTERNAL HELPERS ──────────────────────────────────────────────────────────
 
+def _verify_meta_signature(body: bytes, signature: str) -> bool:
+    """Check X-Hub-Signature-256 by comparing raw 32-byte digests"""
+    if not _META_SECRET_BYTES or not signature.startswith(_META_SIGNATURE_PREFIX):
+        return False
+    try:
+        received = bytes.fromhex(signature[len(_META_SIGNATURE_PREFIX):])
+    except ValueError:
+        return False
+    expected = hmac.new(_META_SECRET_BYTES, body, hashlib.sha256).digest()
+    return hmac.compare_digest(received, expected)
+
+
 async def _verify_meta_token(access_token: str, account_id: str) -> bool:
     """Verify Meta access token is valid"""
     try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.get(
-                f"{META_BASE_URL}/me",
-                params={"access_token": access_token, "fields": "id,name"},
-            )
-            return resp.status_code == 200
+        client = get_http()
+        resp = await client.get(
+            f"{META_BASE_URL}/me",
+            params={"access_token": access_token, "fields": "id,name"},
+        )
+        return resp.status_code == 200
     except Exception:
         return False
 
 
+async def _refresh_stale_accounts(agent_id: UUID, account_ids: list[UUID]):
+    """Background task: refresh stale platform caches in a session of its own"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(AdAccount).where(AdAccount.id.in_(account_ids)))
+        accounts = result.scalars().all()
+        # Platform calls only touch attributes, never the session, so they can overlap
+        outcomes = await asyncio.gather(
+            *(_refresh_platform_cache(account, db) for account in accounts),
+            return_exceptions=True,
+        )
+        for account, outcome in zip(accounts, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Failed to refresh {account.platform} cache for account {account.id}: {outcome}")
+        await db.commit()
+    await cache_delete(_performance_cache_key(agent_id))
+
+
 async def _refresh_platform_cache(account: AdAccount, db: AsyncSession):
     """Refresh cached performance data for a platform"""
     if account.platform == "meta":
         try:
-            async with httpx.AsyncClient() as http:
-                resp = await http.get(
-                    f"{META_BASE_URL}/act_{account.account_id}/insights",
-                    params={
-                        "access_token": account.access_token,
-                        "fields": "spend,leads",
-                        "date_preset": "this_month",
-                    },
-                )
-                data = resp.json().get("data", [{}])[0]
-                spend = float(data.get("spend", 0))
-                leads = int(data.get("leads", 0))
-                account.cached_spend = spend
-                account.cached_leads = leads
-                account.cached_cpl = round(spend / leads, 2) if leads > 0 else 0
-                account.cache_updated_at = datetime.utcnow()
+            http = get_http()
+            resp = await http.get(
+                f"{META_BASE_URL}/act_{account.account_id}/insights",
+                params={
+                    "access_token": account.access_token,
+                    "fields": "spend,leads",
+                    "date_preset": "this_month",
+                },
+            )
+            resp.raise_for_status()
+            data = resp.json().get("data", [{}])[0]
+            spend = float(data.get("spend", 0))
+            leads = int(data.get("leads", 0))
+            account.cached_spend = spend
+            account.cached_leads = leads
+            account.cached_cpl = round(spend / leads, 2) if leads > 0 else 0
+            account.cache_updated_at = datetime.utcnow()
         except Exception as e:
             logger.warning(f"Failed to refresh Meta cache: {e}")
 
 
 async def _build_meta_location_targeting(location: str, radius_miles: int) -> dict:
     """Build Meta geo-targeting object for a location string"""
+    # Agents target the same few areas over and over; memoize per (location, radius)
+    cache_key = (" ".join(location.lower().split()), radius_miles)
+    targeting = _geo_targeting_cache.get(cache_key)
+    if targeting is not None:
+        return targeting
+
     # In production: geocode the location string to lat/lng using Google Geocoding API
     # For now, return a US city targeting structure
-    return {
+    targeting = {
         "custom_locations": [{
             "address_string": location,
             "radius": radius_miles,
             "distance_unit": "mile",
         }]
     }
+    _geo_targeting_cache[cache_key] = targeting
+    return targeting
+
+
+def _meta_account_key(account_id: Optional[str]) -> str:
+    """Graph API returns bare ids; connected accounts may be stored as act_<id>"""
+    return (account_id or "").removeprefix("act_")
 
 
-async def _process_meta_lead(lead_data: dict, db: AsyncSession):
+async def _resolve_meta_ad_account(ad_id: str, access_tokens: list[str]) -> Optional[str]:
     """
-    Background task: parse Meta lead form submission and create Lead record.
+    Map a Meta ad id to the ad account that owns it (cached for a day).
+    The app token has no ads_read on agents' accounts, so the lookup uses
+    the connected accounts' own tokens until one of them can see the ad.
+    """
+    cache_key = f"{CACHE_PREFIX}:meta:ad_account:{ad_id}"
+    account_id = await cache_get(cache_key)
+    if account_id is not None:
+        return account_id
+    for token in access_tokens:
+        try:
+            resp = await get_http().get(
+                f"{META_BASE_URL}/{ad_id}",
+                params={"access_token": token, "fields": "account_id"},
+            )
+            if resp.status_code != 200:
+                continue  # this account can't see the ad; try the next one
+            account_id = _meta_account_key(resp.json().get("account_id"))
+        except Exception as e:
+            logger.warning(f"Failed to resolve Meta ad {ad_id}: {e}")
+            continue
+        if account_id:
+            await cache_set(cache_key, account_id, META_AD_ACCOUNT_CACHE_TTL_SECONDS)
+            return account_id
+    return None
+
+
+async def _claim_meta_lead(leadgen_id: Optional[str]) -> bool:
+    """Meta redelivers webhooks; only the first delivery of a leadgen_id is processed"""
+    if not leadgen_id:
+        return True
+    return await claim_once(_meta_lead_key(leadgen_id), META_LEAD_DEDUPE_TTL_SECONDS)
+
+
+def _meta_lead_key(leadgen_id: str) -> str:
+    return f"{CACHE_PREFIX}:meta:lead:{leadgen_id}"
+
+
+async def _release_meta_leads(lead_batch: list[dict]):
+    """Undo claims for leads that were not stored, so a redelivery is processed"""
+    await cache_delete(*(_meta_lead_key(d["leadgen_id"]) for d in lead_batch if d.get("leadgen_id")))
+
+
+async def _process_meta_leads(lead_batch: list[dict]):
+    """
+    Background task: parse Meta lead form submissions and create Lead records.
     Meta sends field data as a list of {name, values} pairs.
+    One webhook delivery can carry several leads; they are inserted in a
+    single statement and a single commit, in a session of the task's own.
     """
-    try:
-        ad_id = lead_data.get("ad_id")
-        campaign_id = lead_data.get("campaign_id")
-        form_data = {f["name"]: f["values"][0] for f in lead_data.get("field_data", [])}
+    claims = await asyncio.gather(*(_claim_meta_lead(d.get("leadgen_id")) for d in lead_batch))
+    lead_batch = [d for d, claimed in zip(lead_batch, claims) if claimed]
+    if not lead_batch:
+        return
 
-        # Find agent by their Meta ad account
-        agent_result = await db.execute(
-            select(AdAccount).where(AdAccount.platform == "meta")
-        )
-        # In production: match by campaign_id -> agent. For now use first account
-        ad_account = agent_result.scalars().first()
-        if not ad_account:
+    try:
+        async with AsyncSessionLocal() as db:
+            account_result = await db.execute(
+                select(AdAccount.account_id, AdAccount.agent_id, AdAccount.access_token)
+                .where(AdAccount.platform == "meta")
+                .order_by(AdAccount.created_at)
+            )
+            accounts = account_result.all()
+        if not accounts:
+            logger.warning(f"No Meta ad account connected, can't route {len(lead_batch)} lead(s)")
+            await _release_meta_leads(lead_batch)
             return
+        agent_by_account = {_meta_account_key(a.account_id): a.agent_id for a in accounts}
+        # Leads whose ad can't be resolved still land somewhere: the oldest
+        # Meta account's agent, as before per-account routing
+        fallback_agent_id = accounts[0].agent_id
+
+        # Route each lead to the agent whose ad account ran the ad (no connection held meanwhile)
+        tokens = [a.access_token for a in accounts if a.access_token]
+        ad_ids = list({str(d["ad_id"]) for d in lead_batch if d.get("ad_id")})
+        resolved = await asyncio.gather(*(_resolve_meta_ad_account(a, tokens) for a in ad_ids))
+        account_by_ad = dict(zip(ad_ids, resolved))
+
+        async with AsyncSessionLocal() as db:
+            rows = []
+            for lead_data in lead_batch:
+                ad_id = str(lead_data.get("ad_id"))
+                agent_id = agent_by_account.get(account_by_ad.get(ad_id))
+                if not agent_id:
+                    logger.warning(f"No connected account owns Meta ad {ad_id}, routing to the default account")
+                    agent_id = fallback_agent_id
+                form_data = {f["name"]: f["values"][0] for f in lead_data.get("field_data", [])}
+                rows.append({
+                    "agent_id": agent_id,
+                    "first_name": form_data.get("first_name", ""),
+                    "last_name": form_data.get("last_name"),
+                    "email": form_data.get("email"),
+                    "phone": form_data.get("phone_number"),
+                    "source": LeadSource.meta,
+                    "ad_campaign_id": str(lead_data.get("campaign_id")),
+                    "ad_set_id": lead_data.get("adgroup_id"),
+                    "ad_id": ad_id,
+                    "external_id": f"meta:{lead_data['leadgen_id']}" if lead_data.get("leadgen_id") else None,
+                })
+            if not rows:
+                return
+
+            # The unique external_id is the backstop when Redis is down or has evicted the claim
+            result = await db.execute(
+                pg_insert(Lead).on_conflict_do_nothing(index_elements=[Lead.external_id]).returning(Lead.agent_id),
+                rows,
+            )
+            inserted_agent_ids = result.scalars().all()
+            await db.commit()
 
-        lead = Lead(
-            agent_id=ad_account.agent_id,
-            first_name=form_data.get("first_name", ""),
-            last_name=form_data.get("last_name"),
-            email=form_data.get("email"),
-            phone=form_data.get("phone_number"),
-            source=LeadSource.meta,
-            ad_campaign_id=str(campaign_id),
-            ad_id=str(ad_id),
-        )
-        db.add(lead)
-        await db.commit()
-        logger.info(f"Created Meta lead: {lead.first_name} {lead.last_name}")
+        agent_ids = set(inserted_agent_ids)
+        for agent_id in agent_ids:
+            await invalidate_agent_responses(agent_id)
+        logger.info(f"Created {len(inserted_agent_ids)} Meta lead(s) for {len(agent_ids)} agent(s)")
 
     except Exception as e:
-        logger.error(f"Failed to process Meta lead: {e}")
+        logger.error(f"Failed to process Meta leads: {e}")
+        # Nothing was committed (the insert and commit come last): let redeliveries through
+        await _release_meta_leads(lead_batch)
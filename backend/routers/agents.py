@@ -6,16 +6,19 @@ Registration, login, profile management (multi-tenant auth)
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import datetime, timedelta
 from uuid import UUID
 
 from models.database import Agent, SubscriptionPlan, SubscriptionStatus, get_db
-from middleware.auth import hash_password, verify_password, create_access_token, get_current_agent
+from middleware.auth import hash_password, verify_password, create_access_token, get_current_agent, invalidate_agent
 
 router = APIRouter()
 
+_REQUIRED_AGENT_COLUMNS = frozenset(c.name for c in Agent.__table__.columns if not c.nullable)
+
 
 # ── SCHEMAS ───────────────────────────────────────────────────────────────────
 
@@ -70,34 +73,34 @@ class AgentResponse(BaseModel):
 @router.post("/register", status_code=201)
 async def register(data: AgentRegister, db: AsyncSession = Depends(get_db)):
     """Register a new agent (creates tenant). Starts 14-day free trial."""
-    existing = await db.execute(select(Agent).where(Agent.email == data.email))
-    if existing.scalar_one_or_none():
-        raise HTTPException(status_code=400, detail="Email already registered")
-
     agent = Agent(
         email=data.email,
-        hashed_password=hash_password(data.password),
+        hashed_password=await hash_password(data.password),
         full_name=data.full_name,
         phone=data.phone,
         brokerage=data.brokerage,
         location=data.location,
-subscription_plan=SubscriptionPlan.tier1,
+        subscription_plan=SubscriptionPlan.tier1,
         subscription_status=SubscriptionStatus.trialing,
         trial_ends_at=datetime.utcnow() + timedelta(days=14),
     )
     db.add(agent)
-    await db.flush()
+    # agents.email is unique; let the constraint catch duplicates (and signup races)
+    try:
+        await db.flush()
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail="Email already registered")
 
     token = create_access_token(str(agent.id), agent.email)
     return {
         "access_token": token,
         "token_type": "bearer",
         "agent": {
-            "id": str(agent.id),
+            "id": agent.id,
             "email": agent.email,
             "full_name": agent.full_name,
             "subscription_status": agent.subscription_status.value,
-            "trial_ends_at": agent.trial_ends_at.isoformat(),
+            "trial_ends_at": agent.trial_ends_at,
         },
     }
 
@@ -108,7 +111,7 @@ async def login(data: AgentLogin, db: AsyncSession = Depends(get_db)):
     result = await db.execute(select(Agent).where(Agent.email == data.email, Agent.is_active == True))
     agent = result.scalar_one_or_none()
 
-    if not agent or not verify_password(data.password, agent.hashed_password):
+    if not agent or not await verify_password(data.password, agent.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
@@ -119,12 +122,12 @@ async def login(data: AgentLogin, db: AsyncSession = Depends(get_db)):
         "access_token": token,
         "token_type": "bearer",
         "agent": {
-            "id": str(agent.id),
+            "id": agent.id,
             "email": agent.email,
             "full_name": agent.full_name,
             "subscription_plan": agent.subscription_plan.value,
             "subscription_status": agent.subscription_status.value,
-            "trial_ends_at": agent.trial_ends_at.isoformat() if agent.trial_ends_at else None,
+            "trial_ends_at": agent.trial_ends_at,
         },
     }
 
@@ -141,7 +144,12 @@ async def update_profile(
     agent: Agent = Depends(get_current_agent),
     db: AsyncSession = Depends(get_db),
 ):
-    """Update agent profile and settings"""
-    for field, value in data.dict(exclude_none=True).items():
+    """Update agent profile and settings. Only fields present in the body are touched; null clears a field."""
+    changes = data.model_dump(exclude_unset=True)
+    cleared_required = [f for f, v in changes.items() if v is None and f in _REQUIRED_AGENT_COLUMNS]
+    if cleared_required:
+        raise HTTPException(status_code=400, detail=f"Cannot clear required field(s): {', '.join(cleared_required)}")
+    for field, value in changes.items():
         setattr(agent, field, value)
+    invalidate_agent(agent.id)
     return agent
@@ -8,23 +8,60 @@ STEP 3: Stripe Billing Router
 - Trial to paid conversion
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Request, Header
+from fastapi import APIRouter, Depends, HTTPException, Request, Header, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from pydantic import BaseModel
+from sqlalchemy import select, update
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
-import stripe
+from datetime import datetime, timedelta
+from cachetools import TTLCache
+import asyncio
+import hashlib
+import orjson
 import os
 import logging
 
-from models.database import Agent, SubscriptionPlan, SubscriptionStatus, get_db
-from middleware.auth import get_current_agent
+from models.database import Agent, SubscriptionPlan, SubscriptionStatus, AsyncSessionLocal, get_db
+from middleware.auth import get_current_agent, invalidate_agent
+from services.cache_service import CACHE_PREFIX, cache_delete, claim_once
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
 STRIPE_WEBHOOK_SECRET = os.getenv("STRIPE_WEBHOOK_SECRET")
+STRIPE_MAX_NETWORK_RETRIES = int(os.getenv("STRIPE_MAX_NETWORK_RETRIES", "3"))
+STRIPE_WEBHOOK_WORKERS = int(os.getenv("STRIPE_WEBHOOK_WORKERS", "4"))
+STRIPE_WEBHOOK_QUEUE_SIZE = int(os.getenv("STRIPE_WEBHOOK_QUEUE_SIZE", "1000"))
+STRIPE_EVENT_DEDUPE_TTL_SECONDS = 60 * 60 * 24
+# Queued events were already acked, so Stripe won't redeliver: retry transient
+# failures (pool timeouts, DB blips) here before giving up
+STRIPE_WEBHOOK_ATTEMPTS = 4
+STRIPE_WEBHOOK_RETRY_BASE_SECONDS = 1.0
+
+_stripe = None
+_webhook_queue: Optional[asyncio.Queue] = None
+_webhook_workers: list[asyncio.Task] = []
+_seen_events = TTLCache(maxsize=10_000, ttl=STRIPE_EVENT_DEDUPE_TTL_SECONDS)
+
+
+def _get_stripe():
+    """Import and configure the Stripe SDK on first use, keeping it off the startup path"""
+    global _stripe
+    if _stripe is None:
+        import stripe
+        stripe.api_key = os.getenv("STRIPE_SECRET_KEY")
+        # SDK-level exponential backoff with jitter on network errors, 409s and retryable 5xx
+        stripe.max_network_retries = STRIPE_MAX_NETWORK_RETRIES
+        stripe.enable_telemetry = False
+        _stripe = stripe
+    return _stripe
+
+
+async def _run_stripe(fn, *args, **kwargs):
+    """The Stripe SDK does blocking HTTPS; run each call on a worker thread"""
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
 
 # ── PRICING TIERS ─────────────────────────────────────────────────────────────
 PLANS = {
@@ -102,15 +139,50 @@ PLANS = {
         ],
     },
 }
+
+# PLANS is static for the process lifetime; serialize it once
+_PLANS_JSON = orjson.dumps(PLANS)
+_PLANS_HEADERS = {"Cache-Control": "public, max-age=300"}
+
+# Stripe timestamps are Unix seconds; our DateTime columns hold naive UTC
+_UNIX_EPOCH = datetime(1970, 1, 1)
+
+# Stripe subscription status / metadata plan -> our enums
+_STATUS_MAP = {
+    "active": SubscriptionStatus.active,
+    "trialing": SubscriptionStatus.trialing,
+    "past_due": SubscriptionStatus.past_due,
+    "canceled": SubscriptionStatus.canceled,
+    "unpaid": SubscriptionStatus.past_due,
+}
+_PLAN_MAP = {
+    "starter": SubscriptionPlan.starter,
+    "pro": SubscriptionPlan.pro,
+    "team": SubscriptionPlan.team,
+    "tier1": SubscriptionPlan.tier1,
+    "tier2": SubscriptionPlan.tier2,
+    "tier3": SubscriptionPlan.tier3,
+    "tier4": SubscriptionPlan.tier4,
+}
+# Plan changes made in the Customer Portal carry a price but no plan metadata
+_PRICE_ID_TO_PLAN = {v["price_id"]: _PLAN_MAP[k] for k, v in PLANS.items()}
+
 # ── SCHEMAS ───────────────────────────────────────────────────────────────────
 
+_REQUEST_CONFIG = ConfigDict(extra="forbid", frozen=True)
+
+
 class CheckoutRequest(BaseModel):
+    model_config = _REQUEST_CONFIG
+
     plan: str  # starter, pro, team
     success_url: str = "https://app.realboost.ai/billing/success"
     cancel_url: str = "https://app.realboost.ai/billing"
 
 
 class PortalRequest(BaseModel):
+    model_config = _REQUEST_CONFIG
+
     return_url: str = "https://app.realboost.ai/settings"
 
 
@@ -119,22 +191,53 @@ class PortalRequest(BaseModel):
 @router.get("/plans")
 async def get_plans():
     """Return all available subscription plans (public endpoint)"""
-    return PLANS
+    return Response(content=_PLANS_JSON, media_type="application/json", headers=_PLANS_HEADERS)
+
+
+def _billing_etag(agent: Agent) -> Optional[str]:
+    # Every billing field lives on the agent row, so its updated_at versions the body
+    if agent.updated_at is None:
+        return None
+    digest = hashlib.md5(f"{agent.id}:{agent.updated_at.timestamp()}".encode(), usedforsecurity=False)
+    return f'"{digest.hexdigest()}"'
+
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Weak comparison against an If-None-Match list (RFC 9110 §13.1.2)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.strip('"')
+    return any(
+        tag.strip().removeprefix("W/").strip('"') == opaque
+        for tag in if_none_match.split(",")
+    )
 
 
 @router.get("/status")
-async def get_billing_status(agent: Agent = Depends(get_current_agent)):
-    """Get current agent's billing status"""
-    return {
+async def get_billing_status(request: Request, agent: Agent = Depends(get_current_agent)):
+    """
+    Get current agent's billing status.
+    The frontend polls this; unchanged state is answered with a bodiless 304.
+    """
+    etag = _billing_etag(agent)
+    if etag is not None:
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if _etag_matches(etag, request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+    else:
+        headers = None
+    return ORJSONResponse({
         "plan": agent.subscription_plan.value if agent.subscription_plan else None,
         "status": agent.subscription_status.value if agent.subscription_status else None,
-        "trial_ends_at": agent.trial_ends_at.isoformat() if agent.trial_ends_at else None,
-        "subscription_ends_at": agent.subscription_ends_at.isoformat() if agent.subscription_ends_at else None,
+        "trial_ends_at": agent.trial_ends_at,
+        "subscription_ends_at": agent.subscription_ends_at,
         "stripe_customer_id": agent.stripe_customer_id,
         "has_active_subscription": agent.subscription_status in (
             SubscriptionStatus.active, SubscriptionStatus.trialing
         ),
-    }
+    }, headers=headers)
 
 
 @router.post("/checkout")
@@ -151,26 +254,31 @@ async def create_checkout_session(
         raise HTTPException(status_code=400, detail=f"Invalid plan. Choose: {list(PLANS.keys())}")
 
     plan = PLANS[data.plan]
+    stripe = _get_stripe()
 
     # Create or retrieve Stripe customer
     if not agent.stripe_customer_id:
-        customer = stripe.Customer.create(
+        customer = await _run_stripe(
+            stripe.Customer.create,
             email=agent.email,
             name=agent.full_name,
             metadata={"agent_id": str(agent.id), "brokerage": agent.brokerage or ""},
         )
         agent.stripe_customer_id = customer.id
+        invalidate_agent(agent.id)
 
     # If agent already has an active subscription, redirect to portal
     if agent.stripe_subscription_id and agent.subscription_status == SubscriptionStatus.active:
-        portal = stripe.billing_portal.Session.create(
+        portal = await _run_stripe(
+            stripe.billing_portal.Session.create,
             customer=agent.stripe_customer_id,
             return_url=data.cancel_url,
         )
         return {"url": portal.url, "type": "portal"}
 
     # Create checkout session
-    session = stripe.checkout.Session.create(
+    session = await _run_stripe(
+        stripe.checkout.Session.create,
         customer=agent.stripe_customer_id,
         payment_method_types=["card"],
         line_items=[{"price": plan["price_id"], "quantity": 1}],
@@ -200,7 +308,9 @@ async def create_customer_portal(
     if not agent.stripe_customer_id:
         raise HTTPException(status_code=400, detail="No billing account found. Please subscribe first.")
 
-    session = stripe.billing_portal.Session.create(
+    stripe = _get_stripe()
+    session = await _run_stripe(
+        stripe.billing_portal.Session.create,
         customer=agent.stripe_customer_id,
         return_url=data.return_url,
     )
@@ -211,26 +321,138 @@ async def create_customer_portal(
 async def stripe_webhook(
     request: Request,
     stripe_signature: str = Header(None, alias="stripe-signature"),
-    db: AsyncSession = Depends(get_db),
 ):
     """
     Stripe webhook handler.
-    Processes subscription lifecycle events to update agent access.
+    Verifies the signature, then hands the event to the webhook workers and
+    acks right away. Falls back to processing inline when the queue is full.
     """
     payload = await request.body()
+    stripe = _get_stripe()
 
     try:
-        event = stripe.Webhook.construct_event(payload, stripe_signature, STRIPE_WEBHOOK_SECRET)
+        event = await _run_stripe(stripe.Webhook.construct_event, payload, stripe_signature, STRIPE_WEBHOOK_SECRET)
     except stripe.error.SignatureVerificationError:
         raise HTTPException(status_code=400, detail="Invalid webhook signature")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+    logger.info(f"Stripe webhook received: {event['type']}")
+
+    if not await _claim_stripe_event(event["id"]):
+        logger.info(f"Skipping duplicate Stripe event {event['id']}")
+        return {"status": "duplicate"}
+
+    if _webhook_queue is not None:
+        try:
+            _webhook_queue.put_nowait(event)
+            return {"status": "queued"}
+        except asyncio.QueueFull:
+            logger.warning("Stripe webhook queue full, processing inline")
+
+    try:
+        await _process_stripe_event(event)
+    except Exception:
+        # The 500 makes Stripe redeliver; the retry must not be taken for a duplicate
+        await _release_stripe_event(event["id"])
+        raise
+    return {"status": "ok"}
+
+
+# ── WEBHOOK WORKERS ───────────────────────────────────────────────────────────
+
+async def _claim_stripe_event(event_id: str) -> bool:
+    """
+    Stripe redelivers on timeouts and non-2xx; process each event id once.
+    The local cache answers repeats to this worker without a Redis hop;
+    Redis SET NX covers the other workers.
+    """
+    if event_id in _seen_events:
+        return False
+    _seen_events[event_id] = True
+    return await claim_once(f"{CACHE_PREFIX}:stripe:event:{event_id}", STRIPE_EVENT_DEDUPE_TTL_SECONDS)
+
+
+async def _release_stripe_event(event_id: str):
+    """Undo a claim whose event was never applied, so a redelivery is processed"""
+    _seen_events.pop(event_id, None)
+    await cache_delete(f"{CACHE_PREFIX}:stripe:event:{event_id}")
+
+
+async def _process_stripe_event(event):
+    """Apply one verified Stripe event in its own transaction"""
+    async with AsyncSessionLocal() as db:
+        await _dispatch_stripe_event(event, db)
+        await db.commit()
+
+
+async def _process_queued_event(event):
+    """Apply an acked event with exponential backoff; on final failure free its claim"""
+    for attempt in range(1, STRIPE_WEBHOOK_ATTEMPTS + 1):
+        try:
+            await _process_stripe_event(event)
+            return
+        except Exception as e:
+            if attempt == STRIPE_WEBHOOK_ATTEMPTS:
+                logger.error(
+                    f"Stripe webhook {event.get('id')} ({event.get('type')}) failed after "
+                    f"{attempt} attempts, resend it from the Stripe dashboard: {e}"
+                )
+                # Without this a manual resend would be skipped as a duplicate
+                await _release_stripe_event(event["id"])
+                return
+            delay = STRIPE_WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempt - 1)
+            logger.warning(f"Stripe webhook {event.get('id')} attempt {attempt} failed, retrying in {delay:.0f}s: {e}")
+            await asyncio.sleep(delay)
+
+
+async def _webhook_worker():
+    while True:
+        event = await _webhook_queue.get()
+        try:
+            await _process_queued_event(event)
+        except asyncio.CancelledError:
+            # Stopped mid-event (shutdown): it may not have committed, so don't keep its claim
+            await _release_stripe_event(event["id"])
+            raise
+        finally:
+            _webhook_queue.task_done()
+
+
+async def start_webhook_workers():
+    global _webhook_queue
+    _webhook_queue = asyncio.Queue(maxsize=STRIPE_WEBHOOK_QUEUE_SIZE)
+    _webhook_workers.extend(
+        asyncio.create_task(_webhook_worker(), name=f"stripe-webhook-{i}")
+        for i in range(STRIPE_WEBHOOK_WORKERS)
+    )
+
+
+async def stop_webhook_workers(drain_timeout: float = 10.0):
+    """Give queued events a chance to finish, then stop the workers"""
+    global _webhook_queue
+    if _webhook_queue is None:
+        return
+    try:
+        await asyncio.wait_for(_webhook_queue.join(), timeout=drain_timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Dropping {_webhook_queue.qsize()} unprocessed Stripe webhook event(s) on shutdown")
+        # Free their claims so a resend (or the next instance) can apply them
+        while not _webhook_queue.empty():
+            event = _webhook_queue.get_nowait()
+            await _release_stripe_event(event["id"])
+            _webhook_queue.task_done()
+    for task in _webhook_workers:
+        task.cancel()
+    await asyncio.gather(*_webhook_workers, return_exceptions=True)
+    _webhook_workers.clear()
+    _webhook_queue = None
+
+
+async def _dispatch_stripe_event(event, db: AsyncSession):
     event_type = event["type"]
     data = event["data"]["object"]
 
-    logger.info(f"Stripe webhook received: {event_type}")
-
     # ── SUBSCRIPTION CREATED / UPDATED ────────────────────────────────────────
     if event_type in ("customer.subscription.created", "customer.subscription.updated"):
         await _handle_subscription_updated(data, db)
@@ -241,86 +463,87 @@ async def stripe_webhook(
 
     # ── PAYMENT SUCCEEDED ─────────────────────────────────────────────────────
     elif event_type == "invoice.payment_succeeded":
-        customer_id = data.get("customer")
-        result = await db.execute(select(Agent).where(Agent.stripe_customer_id == customer_id))
-        agent = result.scalar_one_or_none()
+        agent = await _set_status_for_customer(data.get("customer"), SubscriptionStatus.active, db)
         if agent:
-            agent.subscription_status = SubscriptionStatus.active
             logger.info(f"Payment succeeded for agent {agent.email}")
 
     # ── PAYMENT FAILED ────────────────────────────────────────────────────────
     elif event_type == "invoice.payment_failed":
-        customer_id = data.get("customer")
-        result = await db.execute(select(Agent).where(Agent.stripe_customer_id == customer_id))
-        agent = result.scalar_one_or_none()
+        agent = await _set_status_for_customer(data.get("customer"), SubscriptionStatus.past_due, db)
         if agent:
-            agent.subscription_status = SubscriptionStatus.past_due
             logger.warning(f"Payment failed for agent {agent.email}")
             # TODO: Send payment failed email to agent
 
     # ── TRIAL ENDING SOON ─────────────────────────────────────────────────────
     elif event_type == "customer.subscription.trial_will_end":
         customer_id = data.get("customer")
-        result = await db.execute(select(Agent).where(Agent.stripe_customer_id == customer_id))
-        agent = result.scalar_one_or_none()
-        if agent:
-            logger.info(f"Trial ending soon for {agent.email}")
+        result = await db.execute(select(Agent.email).where(Agent.stripe_customer_id == customer_id))
+        email = result.scalar_one_or_none()
+        if email:
+            logger.info(f"Trial ending soon for {email}")
             # TODO: Send trial ending email
 
-    await db.commit()
-    return {"status": "ok"}
-
 
 # ── WEBHOOK HELPERS ───────────────────────────────────────────────────────────
 
-async def _handle_subscription_updated(subscription: dict, db: AsyncSession):
-    customer_id = subscription.get("customer")
-    result = await db.execute(select(Agent).where(Agent.stripe_customer_id == customer_id))
-    agent = result.scalar_one_or_none()
+async def _set_status_for_customer(customer_id: Optional[str], new_status: SubscriptionStatus, db: AsyncSession):
+    """Single UPDATE ... RETURNING; no SELECT and no ORM load of the agent"""
+    result = await db.execute(
+        update(Agent)
+        .where(Agent.stripe_customer_id == customer_id)
+        .values(subscription_status=new_status)
+        .returning(Agent.id, Agent.email)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    if row:
+        invalidate_agent(row.id)
+    return row
 
-    if not agent:
-        logger.warning(f"No agent found for Stripe customer {customer_id}")
-        return
 
-    # Map Stripe status to our enum
-    stripe_status = subscription.get("status")
-    status_map = {
-        "active": SubscriptionStatus.active,
-        "trialing": SubscriptionStatus.trialing,
-        "past_due": SubscriptionStatus.past_due,
-        "canceled": SubscriptionStatus.canceled,
-        "unpaid": SubscriptionStatus.past_due,
-    }
-    agent.subscription_status = status_map.get(stripe_status, SubscriptionStatus.active)
-    agent.stripe_subscription_id = subscription.get("id")
+def _subscription_plan(subscription: dict) -> SubscriptionPlan:
+    """Plan from the subscribed price ID, falling back to checkout metadata"""
+    items = (subscription.get("items") or {}).get("data") or []
+    if items:
+        plan = _PRICE_ID_TO_PLAN.get((items[0].get("price") or {}).get("id"))
+        if plan is not None:
+            return plan
+    return _PLAN_MAP.get((subscription.get("metadata") or {}).get("plan", "tier1"), SubscriptionPlan.tier1)
 
-    # Determine plan from metadata or price ID
-metadata = subscription.get("metadata", {})
-plan_name = metadata.get("plan", "tier1")
-plan_map = {
-    "starter": SubscriptionPlan.starter,
-    "pro": SubscriptionPlan.pro,
-    "team": SubscriptionPlan.team,
-    "tier1": SubscriptionPlan.tier1,
-    "tier2": SubscriptionPlan.tier2,
-    "tier3": SubscriptionPlan.tier3,
-    "tier4": SubscriptionPlan.tier4,
-}
+
+async def _handle_subscription_updated(subscription: dict, db: AsyncSession):
+    customer_id = subscription.get("customer")
+    values = {
+        "subscription_status": _STATUS_MAP.get(subscription.get("status"), SubscriptionStatus.active),
+        "stripe_subscription_id": subscription.get("id"),
+        "subscription_plan": _subscription_plan(subscription),
+    }
 
     # Set subscription end date
     current_period_end = subscription.get("current_period_end")
     if current_period_end:
-        from datetime import timezone
-        agent.subscription_ends_at = datetime.fromtimestamp(current_period_end, tz=timezone.utc).replace(tzinfo=None)
+        values["subscription_ends_at"] = _UNIX_EPOCH + timedelta(seconds=current_period_end)
+
+    result = await db.execute(
+        update(Agent)
+        .where(Agent.stripe_customer_id == customer_id)
+        .values(**values)
+        .returning(Agent.id, Agent.email)
+        .execution_options(synchronize_session=False)
+    )
+    row = result.first()
+    if not row:
+        logger.warning(f"No agent found for Stripe customer {customer_id}")
+        return
 
-    logger.info(f"Updated subscription for {agent.email}: {agent.subscription_plan.value} / {agent.subscription_status.value}")
+    invalidate_agent(row.id)
+    logger.info(
+        f"Updated subscription for {row.email}: "
+        f"{values['subscription_plan'].value} / {values['subscription_status'].value}"
+    )
 
 
 async def _handle_subscription_deleted(subscription: dict, db: AsyncSession):
-    customer_id = subscription.get("customer")
-    result = await db.execute(select(Agent).where(Agent.stripe_customer_id == customer_id))
-    agent = result.scalar_one_or_none()
-
+    agent = await _set_status_for_customer(subscription.get("customer"), SubscriptionStatus.canceled, db)
     if agent:
-        agent.subscription_status = SubscriptionStatus.canceled
         logger.info(f"Subscription canceled for {agent.email}")
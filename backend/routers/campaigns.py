@@ -1,20 +1,32 @@
 """Campaigns Router"""
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from pydantic import BaseModel
+from sqlalchemy import select, insert, exists, cast, and_, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
 from uuid import UUID
 from datetime import datetime
+import uuid
 
-from models.database import Campaign, CampaignStep, CampaignEnrollment, Lead, Agent, CampaignType, get_db
-from middleware.auth import get_current_agent, require_active_subscription
+from models.database import Campaign, CampaignStep, CampaignEnrollment, Lead, CampaignType, get_db, get_db_ro
+from middleware.auth import AuthedAgent, get_authed_agent, require_active_authed_agent
 from services.notification_service import send_drip_email
+from services.cache_service import cached, invalidate_agent_responses
 
 router = APIRouter()
 
 
+# Request bodies are parsed once and never mutated; unknown keys are client bugs
+_REQUEST_CONFIG = ConfigDict(extra="forbid", frozen=True)
+
+# Upper bound on leads per enroll call, so one request can't build an unbounded IN / insert batch
+MAX_ENROLL_LEADS = 1000
+
+
 class CampaignCreate(BaseModel):
+    model_config = _REQUEST_CONFIG
+
     name: str
     description: Optional[str] = None
     campaign_type: CampaignType = CampaignType.nurture
@@ -22,6 +34,8 @@ class CampaignCreate(BaseModel):
 
 
 class StepCreate(BaseModel):
+    model_config = _REQUEST_CONFIG
+
     step_order: int
     delay_days: int = 0
     subject: str
@@ -29,96 +43,126 @@ class StepCreate(BaseModel):
 
 
 class EnrollRequest(BaseModel):
-    lead_ids: list[UUID]
+    model_config = _REQUEST_CONFIG
+
+    lead_ids: list[UUID] = Field(max_length=MAX_ENROLL_LEADS)
+
+
+# Per-campaign counts as correlated subqueries, so listing campaigns is one statement
+_ENROLLED_COUNT = (
+    select(func.count(CampaignEnrollment.id))
+    .where(CampaignEnrollment.campaign_id == Campaign.id, CampaignEnrollment.is_active == True)
+    .correlate(Campaign)
+    .scalar_subquery()
+    .label("enrolled_leads")
+)
+_STEPS_COUNT = (
+    select(func.count(CampaignStep.id))
+    .where(CampaignStep.campaign_id == Campaign.id)
+    .correlate(Campaign)
+    .scalar_subquery()
+    .label("steps")
+)
 
 
 @router.get("/")
+@cached(expire=60)
 async def list_campaigns(
-    agent: Agent = Depends(get_current_agent),
-    db: AsyncSession = Depends(get_db),
+    agent: AuthedAgent = Depends(get_authed_agent),
+    db: AsyncSession = Depends(get_db_ro),
 ):
-    result = await db.execute(select(Campaign).where(Campaign.agent_id == agent.id))
-    campaigns = result.scalars().all()
-    output = []
-    for c in campaigns:
-        enrolled = await db.execute(
-            select(func.count(CampaignEnrollment.id)).where(
-                CampaignEnrollment.campaign_id == c.id,
-                CampaignEnrollment.is_active == True,
-            )
-        )
-        steps_count = await db.execute(
-            select(func.count(CampaignStep.id)).where(CampaignStep.campaign_id == c.id)
-        )
-        output.append({
-            "id": str(c.id), "name": c.name, "campaign_type": c.campaign_type.value,
+    result = await db.execute(
+        select(
+            Campaign.id, Campaign.name, Campaign.campaign_type, Campaign.is_active,
+            Campaign.ai_generated, Campaign.created_at,
+            _ENROLLED_COUNT, _STEPS_COUNT,
+        ).where(Campaign.agent_id == agent.id)
+    )
+    return [
+        {
+            "id": c.id, "name": c.name, "campaign_type": c.campaign_type.value,
             "is_active": c.is_active, "ai_generated": c.ai_generated,
-            "enrolled_leads": enrolled.scalar(), "steps": steps_count.scalar(),
-            "created_at": c.created_at.isoformat(),
-        })
-    return output
+            "enrolled_leads": c.enrolled_leads, "steps": c.steps,
+            "created_at": c.created_at,
+        }
+        for c in result
+    ]
 
 
 @router.post("/", status_code=201)
 async def create_campaign(
     data: CampaignCreate,
-    agent: Agent = Depends(require_active_subscription),
+    agent: AuthedAgent = Depends(require_active_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
     campaign = Campaign(agent_id=agent.id, **data.dict())
     db.add(campaign)
-    await db.flush()
-    return {"id": str(campaign.id), "name": campaign.name}
+    await db.commit()
+    await invalidate_agent_responses(agent.id)
+    return {"id": campaign.id, "name": campaign.name}
 
 
 @router.post("/{campaign_id}/steps", status_code=201)
 async def add_campaign_step(
     campaign_id: UUID,
     data: StepCreate,
-    agent: Agent = Depends(get_current_agent),
+    agent: AuthedAgent = Depends(get_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
-    campaign_result = await db.execute(
-        select(Campaign).where(Campaign.id == campaign_id, Campaign.agent_id == agent.id)
+    # INSERT ... SELECT ... WHERE EXISTS: ownership check and insert in one statement
+    values = {"id": uuid.uuid4(), "campaign_id": campaign_id, **data.model_dump()}
+    owned_campaign = exists().where(Campaign.id == campaign_id, Campaign.agent_id == agent.id)
+    result = await db.execute(
+        insert(CampaignStep)
+        .from_select(
+            list(values),
+            # Explicit CASTs: Postgres can't infer parameter types in a bare SELECT list
+            select(*(cast(v, CampaignStep.__table__.c[k].type) for k, v in values.items())).where(owned_campaign),
+        )
+        .returning(CampaignStep.id)
     )
-    campaign = campaign_result.scalar_one_or_none()
-    if not campaign:
+    step_id = result.scalar_one_or_none()
+    if step_id is None:
         raise HTTPException(status_code=404, detail="Campaign not found")
-    step = CampaignStep(campaign_id=campaign_id, **data.dict())
-    db.add(step)
-    await db.flush()
-    return {"id": str(step.id), "step_order": step.step_order}
+    await db.commit()
+    await invalidate_agent_responses(agent.id)
+    return {"id": step_id, "step_order": data.step_order}
 
 
 @router.post("/{campaign_id}/enroll")
 async def enroll_leads(
     campaign_id: UUID,
     data: EnrollRequest,
-    agent: Agent = Depends(require_active_subscription),
+    agent: AuthedAgent = Depends(require_active_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
-    campaign_result = await db.execute(
-        select(Campaign).where(Campaign.id == campaign_id, Campaign.agent_id == agent.id)
+    # Campaign ownership and the agent's own requested leads in one query;
+    # existing enrollments are skipped below by uq_lead_campaign
+    owned = await db.execute(
+        select(Campaign.name, Lead.id)
+        .outerjoin(Lead, and_(Lead.id.in_(set(data.lead_ids)), Lead.agent_id == agent.id))
+        .where(Campaign.id == campaign_id, Campaign.agent_id == agent.id)
     )
-    campaign = campaign_result.scalar_one_or_none()
-    if not campaign:
+    owned_rows = owned.all()
+    if not owned_rows:
         raise HTTPException(status_code=404, detail="Campaign not found")
+    campaign_name = owned_rows[0].name
 
+    now = datetime.utcnow()
+    rows = [
+        {"lead_id": row.id, "campaign_id": campaign_id, "next_send_at": now}
+        for row in owned_rows if row.id is not None
+    ]
     enrolled = 0
-    for lead_id in data.lead_ids:
-        existing = await db.execute(
-            select(CampaignEnrollment).where(
-                CampaignEnrollment.lead_id == lead_id,
-                CampaignEnrollment.campaign_id == campaign_id,
-            )
+    if rows:
+        result = await db.execute(
+            pg_insert(CampaignEnrollment)
+            .on_conflict_do_nothing(constraint="uq_lead_campaign")
+            .returning(CampaignEnrollment.id),
+            rows,
         )
-        if not existing.scalar_one_or_none():
-            enrollment = CampaignEnrollment(
-                lead_id=lead_id,
-                campaign_id=campaign_id,
-                next_send_at=datetime.utcnow(),
-            )
-            db.add(enrollment)
-            enrolled += 1
-
-    return {"enrolled": enrolled, "campaign": campaign.name}
+        enrolled = len(result.scalars().all())
+        await db.commit()
+        await invalidate_agent_responses(agent.id)
+
+    return {"enrolled": enrolled, "campaign": campaign_name}
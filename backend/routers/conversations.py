@@ -1,37 +1,82 @@
 """Conversations Router"""
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from models.database import Lead, Message, Agent, LeadStatus, get_db
-from middleware.auth import get_current_agent
+from sqlalchemy import select, desc, func, true
+import orjson
+from models.database import Lead, Message, LeadStatus, AsyncSessionLocal, get_db_ro
+from middleware.auth import AuthedAgent, get_authed_agent
+from services.cache_service import cached
 
 router = APIRouter()
 
+STREAM_BATCH_SIZE = 500
+
+
+def _conversations_query(agent_id):
+    # Latest message per lead via LATERAL ... LIMIT 1; the inner join drops leads with no messages
+    last_msg = (
+        select(
+            func.left(Message.content, 100).label("content"),
+            Message.role,
+            Message.created_at,
+        )
+        .where(Message.lead_id == Lead.id)
+        .order_by(desc(Message.created_at))
+        .limit(1)
+        .lateral("last_msg")
+    )
+    return (
+        select(
+            Lead.id,
+            Lead.full_name.label("lead_name"),
+            Lead.status,
+            Lead.ai_score,
+            last_msg.c.content, last_msg.c.role, last_msg.c.created_at,
+        )
+        .join(last_msg, true())
+        .where(Lead.agent_id == agent_id)
+        .order_by(desc(Lead.updated_at))
+    )
+
+
+def _conversation(row) -> dict:
+    return {
+        "lead_id": row.id,
+        "lead_name": row.lead_name,
+        "lead_status": row.status.value,
+        "ai_score": row.ai_score,
+        "last_message": row.content,
+        "last_message_role": row.role.value,
+        "last_message_at": row.created_at,
+    }
+
 
 @router.get("/")
+@cached(expire=30)
 async def list_conversations(
-    agent: Agent = Depends(get_current_agent),
-    db: AsyncSession = Depends(get_db),
+    agent: AuthedAgent = Depends(get_authed_agent),
+    db: AsyncSession = Depends(get_db_ro),
 ):
     """Get all leads that have at least one message, sorted by most recent activity"""
-    result = await db.execute(
-        select(Lead).where(Lead.agent_id == agent.id).order_by(desc(Lead.updated_at))
-    )
-    leads = result.scalars().all()
-    conversations = []
-    for lead in leads:
-        last_msg_result = await db.execute(
-            select(Message).where(Message.lead_id == lead.id).order_by(desc(Message.created_at)).limit(1)
-        )
-        last_msg = last_msg_result.scalar_one_or_none()
-        if last_msg:
-            conversations.append({
-                "lead_id": str(lead.id),
-                "lead_name": f"{lead.first_name} {lead.last_name or ''}".strip(),
-                "lead_status": lead.status.value,
-                "ai_score": lead.ai_score,
-                "last_message": last_msg.content[:100],
-                "last_message_role": last_msg.role.value,
-                "last_message_at": last_msg.created_at.isoformat(),
-            })
-    return conversations
+    result = await db.execute(_conversations_query(agent.id))
+    return [_conversation(row) for row in result]
+
+
+@router.get("/stream")
+async def stream_conversations(agent: AuthedAgent = Depends(get_authed_agent)):
+    """
+    Same rows as list_conversations, as NDJSON (one conversation per line).
+    Rows come off a server-side cursor in batches, so memory stays flat for
+    agents with thousands of leads.
+    """
+    async def generate():
+        # Own session: request-scoped dependencies are closed before the body streams
+        async with AsyncSessionLocal() as db:
+            result = await db.stream(
+                _conversations_query(agent.id).execution_options(yield_per=STREAM_BATCH_SIZE)
+            )
+            async for row in result:
+                yield orjson.dumps(_conversation(row)) + b"\n"
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
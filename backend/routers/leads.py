@@ -4,20 +4,35 @@ CRUD + AI qualification endpoint
 """
 
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks, Query
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc
+from sqlalchemy import select, insert, update, func, desc, delete, tuple_
+from sqlalchemy.orm import load_only
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from uuid import UUID
 from datetime import datetime
+from operator import attrgetter, itemgetter
 
-from models.database import Lead, Message, Agent, LeadStatus, LeadSource, MessageRole, get_db
-from middleware.auth import get_current_agent, require_active_subscription
-from services.ai_service import qualify_lead, score_lead_from_profile
+from models.database import Lead, LEAD_SEARCH_TEXT, Message, CampaignEnrollment, Agent, LeadStatus, LeadSource, MessageRole, get_db, get_db_ro
+from middleware.auth import require_active_subscription, AuthedAgent, get_authed_agent, require_active_authed_agent
+from services.ai_service import qualify_lead, score_lead_profile_rules
 from services.notification_service import send_hot_lead_alert
+from services.cache_service import CACHE_PREFIX, cache_get, cache_set, cache_delete, cached, invalidate_agent_responses
 
 router = APIRouter()
 
+# qualify_lead only sends this many prior messages to the model
+QUALIFY_HISTORY_MESSAGES = 20
+
+# Live chats call /qualify turn after turn for the same lead; its row is cached in Redis
+LEAD_CACHE_TTL_SECONDS = 300
+# Lead columns qualify_lead and the hot lead alert read — the only ones cached
+_QUALIFY_LEAD_COLUMNS = (
+    Lead.id, Lead.agent_id, Lead.first_name, Lead.last_name, Lead.email, Lead.phone,
+    Lead.source, Lead.status, Lead.ai_score, Lead.budget_min, Lead.budget_max,
+)
+
 
 # ── SCHEMAS ───────────────────────────────────────────────────────────────────
 
@@ -89,6 +104,51 @@ class LeadResponse(BaseModel):
         from_attributes = True
 
 
+# Lead columns rendered by LeadResponse. List queries load only these, so
+# must_haves (JSONB) and the tracking columns never leave Postgres.
+_LEAD_RESPONSE_COLUMNS = tuple(
+    name for name in LeadResponse.model_fields if name in Lead.__table__.columns
+)
+_LEAD_LIST_OPTIONS = load_only(*(getattr(Lead, name) for name in _LEAD_RESPONSE_COLUMNS))
+# Per-lead message stats as correlated subqueries, so a page of leads is one statement.
+# Postgres evaluates them after ORDER BY / LIMIT, i.e. only for the returned rows.
+_UNREAD_COUNT = (
+    select(func.count())
+    .where(Message.lead_id == Lead.id, Message.role == MessageRole.lead, Message.is_read == False)
+    .correlate(Lead)
+    .scalar_subquery()
+    .label("unread_count")
+)
+_LAST_MESSAGE_AT = (
+    select(func.max(Message.created_at))
+    .where(Message.lead_id == Lead.id)
+    .correlate(Lead)
+    .scalar_subquery()
+    .label("last_message_at")
+)
+# One C-level call fetches every response column off an instance. Loaded column
+# values live in the instance __dict__, so reading that skips the per-column
+# instrumented descriptors; the attrgetter covers attributes that aren't loaded.
+_lead_response_items = itemgetter(*_LEAD_RESPONSE_COLUMNS)
+_lead_response_values = attrgetter(*_LEAD_RESPONSE_COLUMNS)
+
+
+def _lead_payload(lead: Lead, unread_count: int = 0, last_message_at: Optional[datetime] = None) -> dict:
+    """
+    LeadResponse-shaped dict for ORJSONResponse. Rows come from our own DB, so
+    endpoints return it directly instead of re-validating through response_model;
+    response_model stays on the routes for the OpenAPI schema only.
+    """
+    try:
+        values = _lead_response_items(lead.__dict__)
+    except KeyError:
+        values = _lead_response_values(lead)
+    payload = dict(zip(_LEAD_RESPONSE_COLUMNS, values))
+    payload["unread_count"] = unread_count
+    payload["last_message_at"] = last_message_at
+    return payload
+
+
 # ── ENDPOINTS ─────────────────────────────────────────────────────────────────
 
 @router.get("/", response_model=list[LeadResponse])
@@ -99,111 +159,96 @@ async def list_leads(
     limit: int = Query(50, le=200),
     offset: int = 0,
     sort_by: str = "created_at",
-    agent: Agent = Depends(get_current_agent),
-    db: AsyncSession = Depends(get_db),
+    agent: AuthedAgent = Depends(get_authed_agent),
+    db: AsyncSession = Depends(get_db_ro),
 ):
     """List all leads for the authenticated agent with filtering"""
-    query = select(Lead).where(Lead.agent_id == agent.id)
+    query = (
+        select(Lead, _UNREAD_COUNT, _LAST_MESSAGE_AT)
+        .options(_LEAD_LIST_OPTIONS)
+        .where(Lead.agent_id == agent.id)
+    )
 
     if status:
         query = query.where(Lead.status == status)
     if source:
         query = query.where(Lead.source == source)
     if search:
-        query = query.where(
-            (Lead.first_name.ilike(f"%{search}%")) |
-            (Lead.last_name.ilike(f"%{search}%")) |
-            (Lead.email.ilike(f"%{search}%")) |
-            (Lead.phone.ilike(f"%{search}%"))
-        )
+        # One ILIKE over the indexed concatenation (ix_leads_search_text_trgm)
+        query = query.where(LEAD_SEARCH_TEXT.ilike(f"%{search}%"))
 
     query = query.order_by(desc(Lead.created_at)).limit(limit).offset(offset)
     result = await db.execute(query)
-    leads = result.scalars().all()
-
-    # Enrich with unread count and last message time
-    enriched = []
-    for lead in leads:
-        unread_result = await db.execute(
-            select(func.count(Message.id)).where(
-                Message.lead_id == lead.id,
-                Message.role == MessageRole.lead,
-                Message.is_read == False
-            )
-        )
-        unread_count = unread_result.scalar() or 0
-
-        last_msg_result = await db.execute(
-            select(Message.created_at).where(Message.lead_id == lead.id).order_by(desc(Message.created_at)).limit(1)
-        )
-        last_msg = last_msg_result.scalar_one_or_none()
-
-        lead_dict = {c.name: getattr(lead, c.name) for c in lead.__table__.columns}
-        lead_dict["unread_count"] = unread_count
-        lead_dict["last_message_at"] = last_msg
-        enriched.append(lead_dict)
-
-    return enriched
+    return ORJSONResponse([
+        _lead_payload(lead, unread, last_at) for lead, unread, last_at in result
+    ])
 
 
 @router.post("/", response_model=LeadResponse, status_code=201)
 async def create_lead(
     data: LeadCreate,
-    background_tasks: BackgroundTasks,
-    agent: Agent = Depends(require_active_subscription),
+    agent: AuthedAgent = Depends(require_active_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
-    """Create a new lead and run AI initial scoring"""
+    """Create a new lead, scored from its profile before insert"""
     lead = Lead(agent_id=agent.id, **data.dict(exclude_none=True))
+    lead.ai_score = score_lead_profile_rules(lead)
     db.add(lead)
-    await db.flush()
-
-    # AI score based on profile
-    background_tasks.add_task(_score_lead_background, lead.id, db)
+    await db.commit()
+    await invalidate_agent_responses(agent.id)
 
-    lead_dict = {c.name: getattr(lead, c.name) for c in lead.__table__.columns}
-    lead_dict["unread_count"] = 0
-    lead_dict["last_message_at"] = None
-    return lead_dict
+    return ORJSONResponse(_lead_payload(lead), status_code=201)
 
 
 @router.get("/{lead_id}", response_model=LeadResponse)
 async def get_lead(
     lead_id: UUID,
-    agent: Agent = Depends(get_current_agent),
-    db: AsyncSession = Depends(get_db),
+    agent: AuthedAgent = Depends(get_authed_agent),
+    db: AsyncSession = Depends(get_db_ro),
 ):
     lead = await _get_lead_or_404(lead_id, agent.id, db)
-    lead_dict = {c.name: getattr(lead, c.name) for c in lead.__table__.columns}
-    lead_dict["unread_count"] = 0
-    lead_dict["last_message_at"] = None
-    return lead_dict
+    return ORJSONResponse(_lead_payload(lead))
 
 
 @router.patch("/{lead_id}", response_model=LeadResponse)
 async def update_lead(
     lead_id: UUID,
     data: LeadUpdate,
-    agent: Agent = Depends(get_current_agent),
+    agent: AuthedAgent = Depends(get_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
     lead = await _get_lead_or_404(lead_id, agent.id, db)
     for field, value in data.dict(exclude_none=True).items():
         setattr(lead, field, value)
-    lead_dict = {c.name: getattr(lead, c.name) for c in lead.__table__.columns}
-    lead_dict["unread_count"] = 0
-    lead_dict["last_message_at"] = None
-    return lead_dict
+    await db.commit()
+    await cache_delete(_lead_cache_key(lead_id))
+    await invalidate_agent_responses(agent.id)
+    return ORJSONResponse(_lead_payload(lead))
 
 
 @router.delete("/{lead_id}", status_code=204)
 async def delete_lead(
     lead_id: UUID,
-    agent: Agent = Depends(get_current_agent),
+    agent: AuthedAgent = Depends(get_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
-    lead = await _get_lead_or_404(lead_id, agent.id, db)
-    await db.delete(lead)
+    # Set-based deletes instead of session.delete(): the ORM cascade would load
+    # every message and enrollment row just to delete them one by one
+    owned = select(Lead.id).where(Lead.id == lead_id, Lead.agent_id == agent.id)
+    no_sync = {"synchronize_session": False}
+    await db.execute(delete(Message).where(Message.lead_id.in_(owned)), execution_options=no_sync)
+    await db.execute(
+        delete(CampaignEnrollment).where(CampaignEnrollment.lead_id.in_(owned)), execution_options=no_sync
+    )
+    result = await db.execute(
+        delete(Lead).where(Lead.id == lead_id, Lead.agent_id == agent.id).returning(Lead.id),
+        execution_options=no_sync,
+    )
+    if result.first() is None:
+        raise HTTPException(status_code=404, detail="Lead not found")
+    await db.commit()
+    await cache_delete(_lead_cache_key(lead_id))
+    await invalidate_agent_responses(agent.id)
 
 
 @router.post("/{lead_id}/qualify")
@@ -219,44 +264,70 @@ async def qualify_lead_message(
     Receives an incoming lead message, runs it through GPT-4o qualification,
     saves both messages, updates lead score, triggers hot lead alert if needed.
     """
-    lead = await _get_lead_or_404(lead_id, agent.id, db)
+    lead = await _get_qualify_lead(lead_id, agent.id, db)
 
-    # Load conversation history
+    # Load conversation history: the most recent turns the model sees, oldest first.
+    # Plain (role, content) rows, no Message instances. Each row's created_at is its own
+    # clock time; id (monotonic uuid7) breaks any remaining tie. Rows written before the
+    # upgrade share their transaction's created_at and have random uuid4 ids, so the
+    # order within those pairs is arbitrary; only newer rows are strictly chronological.
     history_result = await db.execute(
-        select(Message).where(Message.lead_id == lead_id).order_by(Message.created_at).limit(50)
+        select(Message.role, Message.content)
+        .where(Message.lead_id == lead_id)
+        .order_by(desc(Message.created_at), desc(Message.id))
+        .limit(QUALIFY_HISTORY_MESSAGES)
     )
     history = [
-        {"role": msg.role.value, "content": msg.content}
-        for msg in history_result.scalars().all()
+        {"role": role.value, "content": content}
+        for role, content in reversed(history_result.all())
     ]
 
-    # Save the incoming lead message
-    lead_msg = Message(
-        lead_id=lead_id,
-        role=MessageRole.lead,
-        content=message.content,
-        is_read=False,
-    )
-    db.add(lead_msg)
-    await db.flush()
-
     # Run AI qualification
+    before = {"ai_score": lead.ai_score, "status": lead.status}
     result = await qualify_lead(lead, agent, message.content, history, db)
 
-    # Save AI response
-    ai_msg = Message(
-        lead_id=lead_id,
-        role=MessageRole.ai,
-        content=result["ai_response"],
-        ai_model="gpt-4o",
-        ai_prompt_tokens=result["prompt_tokens"],
-        ai_completion_tokens=result["completion_tokens"],
-        triggered_hot_lead_alert=result["alert_agent"],
-        score_at_time=result["score"],
-        is_read=True,
+    # qualify_lead only set the new score/status on our unattached copy. Write them
+    # and both messages in one statement: the lead UPDATE rides along as a
+    # data-modifying CTE of the multi-row message INSERT. Only columns the AI actually
+    # changed are written, so a stale snapshot never reverts a concurrent edit.
+    changed = {column: getattr(lead, column) for column, value in before.items() if getattr(lead, column) != value}
+    lead_update = (
+        update(Lead)
+        .where(Lead.id == lead_id)
+        .values(**changed, last_contacted_at=func.timezone("utc", func.now()))
+        .returning(Lead.id)
+        .cte("lead_update")
+    )
+    await db.execute(
+        insert(Message).values([
+            {
+                "lead_id": lead_id,
+                "role": MessageRole.lead,
+                "content": message.content,
+                "is_read": False,
+                "ai_model": None,
+                "ai_prompt_tokens": None,
+                "ai_completion_tokens": None,
+                "triggered_hot_lead_alert": False,
+                "score_at_time": None,
+            },
+            {
+                "lead_id": lead_id,
+                "role": MessageRole.ai,
+                "content": result["ai_response"],
+                "is_read": True,
+                "ai_model": "gpt-4o",
+                "ai_prompt_tokens": result["prompt_tokens"],
+                "ai_completion_tokens": result["completion_tokens"],
+                "triggered_hot_lead_alert": result["alert_agent"],
+                "score_at_time": result["score"],
+            },
+        ]).add_cte(lead_update)
     )
-    db.add(ai_msg)
-    lead.last_contacted_at = datetime.utcnow()
+    await db.commit()
+    # Refresh the snapshot with the committed score/status so the next turn is a cache hit
+    await cache_set(_lead_cache_key(lead_id), _qualify_lead_snapshot(lead), LEAD_CACHE_TTL_SECONDS)
+    await invalidate_agent_responses(agent.id)
 
     # Trigger hot lead alert in background
     if result["alert_agent"]:
@@ -267,82 +338,130 @@ async def qualify_lead_message(
             key_findings=result["key_findings"],
         )
 
-    return {
+    return ORJSONResponse({
         "ai_response": result["ai_response"],
         "lead_score": result["score"],
         "lead_status": result["status"],
         "is_hot_lead": result["alert_agent"],
         "key_findings": result["key_findings"],
-    }
+    })
 
 
 @router.get("/{lead_id}/messages")
 async def get_conversation(
     lead_id: UUID,
-    agent: Agent = Depends(get_current_agent),
+    limit: int = Query(100, ge=1, le=500),
+    before: Optional[UUID] = None,
+    agent: AuthedAgent = Depends(get_authed_agent),
     db: AsyncSession = Depends(get_db),
 ):
-    """Get full conversation history for a lead"""
+    """
+    Get a lead's conversation, oldest first: the latest `limit` messages, or the
+    `limit` messages preceding message `before` (pass the oldest id you have to page back)
+    """
     await _get_lead_or_404(lead_id, agent.id, db)
 
-    result = await db.execute(
-        select(Message).where(Message.lead_id == lead_id).order_by(Message.created_at)
+    # Mark all lead messages as read in one statement instead of N ORM row updates
+    await db.execute(
+        update(Message)
+        .where(Message.lead_id == lead_id, Message.role == MessageRole.lead, Message.is_read == False)
+        .values(is_read=True)
+        .execution_options(synchronize_session=False)
     )
-    messages = result.scalars().all()
 
-    # Mark all lead messages as read
-    for msg in messages:
-        if msg.role == MessageRole.lead:
-            msg.is_read = True
+    # Newest-first keyset page (backward scan of ix_messages_lead_created), flipped to
+    # chronological. (created_at, id) is a strict total order, so rows tying on created_at
+    # are never skipped across pages. Ties keep creation order only for rows written since
+    # ids became monotonic uuid7s; older uuid4 ties are ordered arbitrarily but stably.
+    query = (
+        select(Message.id, Message.role, Message.content, Message.created_at, Message.score_at_time)
+        .where(Message.lead_id == lead_id)
+        .order_by(desc(Message.created_at), desc(Message.id))
+        .limit(limit)
+    )
+    if before is not None:
+        cursor_at = select(Message.created_at).where(Message.id == before).scalar_subquery()
+        query = query.where(tuple_(Message.created_at, Message.id) < tuple_(cursor_at, before))
+    messages = (await db.execute(query)).all()
+    messages.reverse()
 
-    return [
+    return ORJSONResponse([
         {
-            "id": str(msg.id),
+            "id": msg.id,
             "role": msg.role.value,
             "content": msg.content,
-            "created_at": msg.created_at.isoformat(),
+            "created_at": msg.created_at,
             "score_at_time": msg.score_at_time,
         }
         for msg in messages
-    ]
+    ])
 
 
 @router.get("/stats/overview")
+@cached(expire=45)
 async def get_lead_stats(
-    agent: Agent = Depends(get_current_agent),
-    db: AsyncSession = Depends(get_db),
+    agent: AuthedAgent = Depends(get_authed_agent),
+    db: AsyncSession = Depends(get_db_ro),
 ):
     """Dashboard stats for the agent"""
-    total = await db.execute(select(func.count(Lead.id)).where(Lead.agent_id == agent.id))
-    hot = await db.execute(select(func.count(Lead.id)).where(Lead.agent_id == agent.id, Lead.status == LeadStatus.hot))
-    warm = await db.execute(select(func.count(Lead.id)).where(Lead.agent_id == agent.id, Lead.status == LeadStatus.warm))
-    converted = await db.execute(select(func.count(Lead.id)).where(Lead.agent_id == agent.id, Lead.status == LeadStatus.converted))
+    # One pass over the agent's leads instead of four COUNT round trips
+    result = await db.execute(
+        select(
+            func.count().label("total"),
+            func.count().filter(Lead.status == LeadStatus.hot).label("hot"),
+            func.count().filter(Lead.status == LeadStatus.warm).label("warm"),
+            func.count().filter(Lead.status == LeadStatus.converted).label("converted"),
+        ).where(Lead.agent_id == agent.id)
+    )
+    stats = result.one()
 
     return {
-        "total_leads": total.scalar(),
-        "hot_leads": hot.scalar(),
-        "warm_leads": warm.scalar(),
-        "converted_leads": converted.scalar(),
+        "total_leads": stats.total,
+        "hot_leads": stats.hot,
+        "warm_leads": stats.warm,
+        "converted_leads": stats.converted,
     }
 
 
 # ── HELPERS ───────────────────────────────────────────────────────────────────
 
 async def _get_lead_or_404(lead_id: UUID, agent_id: UUID, db: AsyncSession) -> Lead:
-    result = await db.execute(
-        select(Lead).where(Lead.id == lead_id, Lead.agent_id == agent_id)
-    )
-    lead = result.scalar_one_or_none()
-    if not lead:
+    lead = await db.get(Lead, lead_id)
+    if not lead or lead.agent_id != agent_id:
         raise HTTPException(status_code=404, detail="Lead not found")
     return lead
 
 
-async def _score_lead_background(lead_id: UUID, db: AsyncSession):
-    """Background task to score a lead from profile data"""
-    result = await db.execute(select(Lead).where(Lead.id == lead_id))
-    lead = result.scalar_one_or_none()
-    if lead:
-        score = await score_lead_from_profile(lead)
-        lead.ai_score = score
-        await db.commit()
+def _lead_cache_key(lead_id) -> str:
+    return f"{CACHE_PREFIX}:lead:{lead_id}"
+
+
+def _qualify_lead_snapshot(lead: Lead) -> dict:
+    return {column.key: getattr(lead, column.key) for column in _QUALIFY_LEAD_COLUMNS}
+
+
+async def _get_qualify_lead(lead_id: UUID, agent_id: UUID, db: AsyncSession) -> Lead:
+    """
+    Like _get_lead_or_404, but served from a Redis snapshot of _QUALIFY_LEAD_COLUMNS
+    when one exists. Returns a Lead that is never added to the session: qualify
+    writes its changes with an explicit UPDATE, so nothing is flushed from it.
+    """
+    snapshot = await cache_get(_lead_cache_key(lead_id))
+    if snapshot is None:
+        result = await db.execute(select(*_QUALIFY_LEAD_COLUMNS).where(Lead.id == lead_id))
+        row = result.mappings().first()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Lead not found")
+        snapshot = dict(row)
+        await cache_set(_lead_cache_key(lead_id), snapshot, LEAD_CACHE_TTL_SECONDS)
+    else:
+        # Cached as JSON: restore the UUID and enum types
+        snapshot["id"] = UUID(snapshot["id"])
+        snapshot["agent_id"] = UUID(snapshot["agent_id"])
+        snapshot["source"] = LeadSource(snapshot["source"]) if snapshot["source"] else None
+        snapshot["status"] = LeadStatus(snapshot["status"]) if snapshot["status"] else None
+
+    if snapshot["agent_id"] != agent_id:
+        raise HTTPException(status_code=404, detail="Lead not found")
+
+    return Lead(**snapshot)
@@ -1,35 +1,45 @@
 """Webhooks Router — Twilio TwiML, platform callbacks"""
 from fastapi import APIRouter, Request
 from fastapi.responses import Response
+from string import Template
+from xml.sax.saxutils import escape
+import functools
 
 router = APIRouter()
 
-
-@router.post("/twiml/connect")
-async def twiml_call_connect(request: Request):
-    """
-    TwiML for Twilio call connect.
-    Answers the agent's phone, plays a message, then bridges to the lead.
-    """
-    params = request.query_params
-    lead_phone = params.get("lead_phone", "")
-    lead_name = params.get("lead_name", "your lead")
-
-    twiml = f"""<?xml version="1.0" encoding="UTF-8"?>
+# Built once at import; only the two escaped values are substituted per call
+_TWIML_CONNECT = Template("""<?xml version="1.0" encoding="UTF-8"?>
 <Response>
   <Say voice="Polly.Joanna">
     You have a hot lead alert from RealBoost AI.
-    {lead_name} is on the line and ready to talk.
+    $lead_name is on the line and ready to talk.
     Connecting you now.
   </Say>
   <Dial>
-    <Number>{lead_phone}</Number>
+    <Number>$lead_phone</Number>
   </Dial>
-</Response>"""
+</Response>""")
 
-    return Response(content=twiml, media_type="application/xml")
+# The body carries the lead's name and phone from an unauthenticated URL: keep it
+# out of shared/CDN caches. Repeats are served from the per-process memo below.
+TWIML_CACHE_HEADERS = {"Cache-Control": "no-store"}
 
 
-@router.get("/twiml/connect")
-async def twiml_call_connect_get(request: Request):
-    return await twiml_call_connect(request)
+@functools.lru_cache(maxsize=1024)
+def _connect_twiml(lead_name: str, lead_phone: str) -> bytes:
+    # Query values are caller-controlled: escape them so they can't inject TwiML verbs
+    return _TWIML_CONNECT.substitute(
+        lead_name=escape(lead_name),
+        lead_phone=escape(lead_phone),
+    ).encode()
+
+
+@router.api_route("/twiml/connect", methods=["GET", "POST"])
+async def twiml_call_connect(request: Request):
+    """
+    TwiML for Twilio call connect.
+    Answers the agent's phone, plays a message, then bridges to the lead.
+    """
+    params = request.query_params
+    twiml = _connect_twiml(params.get("lead_name", "your lead"), params.get("lead_phone", ""))
+    return Response(content=twiml, media_type="application/xml", headers=TWIML_CACHE_HEADERS)
@@ -8,26 +8,97 @@ STEP 1: OpenAI AI Service
 - Drip campaign content generation
 """
 
-from openai import AsyncOpenAI
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
+import hashlib
 import json
+import orjson
 import os
+import re
 import logging
 
 from models.database import Lead, Message, Agent, AdAccount, MessageRole, LeadStatus
+from services.cache_service import CACHE_PREFIX, cache_get, cache_set
 
 logger = logging.getLogger(__name__)
 
-client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+_client = None
+
+
+def _get_client():
+    """
+    Import and build the OpenAI client on first use: the SDK's import graph is
+    large and most requests never call OpenAI, so it stays off the startup path.
+    """
+    global _client
+    if _client is None:
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+        class ORJSONHttpxClient(DefaultAsyncHttpxClient):
+            """
+            The SDK's default httpx client, but JSON request bodies are encoded with
+            orjson instead of stdlib json (drip-campaign prompts and schemas are large).
+            """
+            def build_request(self, method, url, *, json=None, content=None, **kwargs):
+                if json is not None and content is None:
+                    content, json = orjson.dumps(json), None
+                return super().build_request(method, url, json=json, content=content, **kwargs)
+
+        _client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), http_client=ORJSONHttpxClient())
+    return _client
+
+
 MODEL = "gpt-4o"
+# Sent to the lead when the model returns no usable reply
+QUALIFY_FALLBACK_RESPONSE = "Thanks for reaching out! {agent_name} will follow up with you shortly."
+
+# Low-temperature, read-only completions are memoized in Redis by request hash
+OPENAI_CACHE_TTL_SECONDS = int(os.getenv("OPENAI_CACHE_TTL_SECONDS", "86400"))
+
+
+async def _cached_completion(**kwargs):
+    """
+    chat.completions.create, cached per exact request (model, messages, sampling
+    params). Stored as the completion's JSON, not pickled. No-op without Redis.
+    """
+    from openai.types.chat import ChatCompletion
+
+    digest = hashlib.blake2b(orjson.dumps(kwargs, option=orjson.OPT_SORT_KEYS), digest_size=16).hexdigest()
+    key = f"{CACHE_PREFIX}:oai:{digest}"
+    hit = await cache_get(key)
+    if hit is not None:
+        return ChatCompletion.model_validate(hit)
+
+    response = await _get_client().chat.completions.create(**kwargs)
+    await cache_set(key, response.model_dump(mode="json"), OPENAI_CACHE_TTL_SECONDS)
+    return response
+
+# Ad budget optimizer: largest share of a platform's monthly budget moved in one step,
+# and whether GPT writes the explanation text (the numbers are always computed locally)
+AD_OPTIMIZER_MAX_SHIFT_FRACTION = float(os.getenv("AD_OPTIMIZER_MAX_SHIFT_FRACTION", "0.25"))
+AD_OPTIMIZER_LLM_EXPLANATIONS = os.getenv("AD_OPTIMIZER_LLM_EXPLANATIONS", "false").lower() == "true"
+
+
+# ── STRUCTURED OUTPUTS ────────────────────────────────────────────────────────
+
+class QualificationUpdate(BaseModel):
+    """Structured reply for qualify_lead: the visible message plus the score update"""
+    ai_response: str = Field(description="Message shown to the lead")
+    score: int = Field(description="Lead score from 0 to 100")
+    status: Literal["cold", "warm", "hot"]
+    key_findings: list[str]
+    is_hot: bool
+    alert_agent: bool = Field(description="True when the agent should contact the lead now")
 
 
 # ── SYSTEM PROMPTS ────────────────────────────────────────────────────────────
 
-def build_qualification_system_prompt(agent: Agent, lead: Lead) -> str:
-    return f"""You are an expert real estate lead qualification assistant working for {agent.full_name} at {agent.brokerage or 'their real estate brokerage'} in {agent.location or 'the local area'}.
+# Static instructions come first and the per-agent / per-lead details last, so every
+# call shares the same prompt prefix and OpenAI's automatic prompt caching can reuse it.
+_QUALIFICATION_PROMPT_PREFIX = """You are an expert real estate lead qualification assistant working for the real estate agent described under AGENT below.
 
 Your job is to have a natural, friendly conversation with potential buyers and sellers to:
 1. Understand their real estate needs
@@ -36,12 +107,6 @@ Your job is to have a natural, friendly conversation with potential buyers and s
 4. Collect contact information
 5. Schedule the agent when the lead is ready
 
-LEAD INFO SO FAR:
-- Name: {lead.first_name} {lead.last_name or ''}
-- Source: {lead.source}
-- Budget: {f'${lead.budget_min:,} - ${lead.budget_max:,}' if lead.budget_max else 'Unknown'}
-- Status: {lead.status}
-
 QUALIFICATION GOALS (gather these naturally, not all at once):
 - Are they buying, selling, or both?
 - What's their timeline? (1 month = HOT, 6+ months = COLD)
@@ -61,26 +126,38 @@ HOT LEAD TRIGGERS — if any of these are true, end the conversation naturally a
 STYLE:
 - Be warm, conversational, and helpful — never robotic
 - Ask ONE question at a time
-- Use local knowledge about {agent.location or 'the area'} when relevant
+- Use local knowledge about the agent's area when relevant
 - Keep messages short (2-4 sentences max)
 - Don't sound like a script — sound like a knowledgeable friend
 
-When you determine this is a HOT LEAD, tell them: "This sounds like a great match — let me get {agent.full_name} on the phone with you right away! They're available today and would love to chat."
+When you determine this is a HOT LEAD, tell them, using the agent's name: "This sounds like a great match — let me get <agent name> on the phone with you right away! They're available today and would love to chat."
+
+Put your reply to the lead in ai_response and your updated assessment of the lead in the remaining fields.
+"""
+
+
+def build_qualification_system_prompt(agent: Agent, lead: Lead) -> str:
+    return _QUALIFICATION_PROMPT_PREFIX + f"""
+AGENT:
+- Name: {agent.full_name}
+- Brokerage: {agent.brokerage or 'their real estate brokerage'}
+- Area: {agent.location or 'the local area'}
 
-IMPORTANT: After every response, include a JSON block at the very end (invisible to user) in this exact format:
-[SCORE_UPDATE: {{"score": 0-100, "status": "cold/warm/hot", "key_findings": ["finding1"], "is_hot": false, "alert_agent": false}}]"""
+LEAD INFO SO FAR:
+- Name: {lead.first_name} {lead.last_name or ''}
+- Source: {lead.source}
+- Budget: {f'${lead.budget_min:,} - ${lead.budget_max:,}' if lead.budget_max else 'Unknown'}
+- Status: {lead.status}"""
 
 
-def build_email_generation_prompt(context: str, agent: Agent, email_type: str) -> str:
-    return f"""You are an expert real estate email copywriter for {agent.full_name}, a real estate agent in {agent.location or 'the local area'}.
+_EMAIL_PROMPT_PREFIX = """You are an expert real estate email copywriter for the real estate agent described under AGENT below.
 
-Write a professional, engaging {email_type} email based on this request:
-{context}
+Write a professional, engaging email of the requested type, based on the user's request.
 
 Requirements:
 - Subject line that gets opened (curiosity, urgency, or personal)
 - Conversational but professional tone
-- Local market relevance for {agent.location or 'the area'}
+- Local market relevance for the agent's area
 - Clear call-to-action
 - 150-300 words for newsletters, 50-150 words for personal emails
 - Use [First Name] as placeholder for personalization
@@ -89,31 +166,33 @@ Requirements:
 Format your response EXACTLY as:
 SUBJECT: <subject line here>
 ---
-<email body here>"""
+<email body here>
+"""
+
+
+def build_email_generation_prompt(agent: Agent, email_type: str) -> str:
+    # The request itself goes in the user message, not repeated here
+    return _EMAIL_PROMPT_PREFIX + f"""
+AGENT:
+- Name: {agent.full_name}
+- Area: {agent.location or 'the local area'}
+
+EMAIL TYPE: {email_type}"""
 
 
-def build_ad_optimization_prompt(platforms_data: list) -> str:
+def build_ad_optimization_prompt(platforms_data: list, recommendation: dict) -> str:
     return f"""You are a digital marketing expert specializing in real estate advertising optimization.
 
-Analyze this ad platform performance data and provide a specific budget reallocation recommendation:
+This ad platform performance data:
 
 {json.dumps(platforms_data, indent=2)}
 
-Provide:
-1. Which platform has the best ROI (lowest CPL + highest lead quality)
-2. Specific dollar amount to shift and from/to which platforms
-3. Projected impact (estimated additional leads per month)
-4. One sentence explanation
+led to this budget reallocation:
 
-Respond in JSON:
-{{
-  "recommendation": "Clear one-sentence action",
-  "from_platform": "platform name",
-  "to_platform": "platform name", 
-  "amount_to_shift": 200,
-  "projected_additional_leads": 7,
-  "reasoning": "Brief explanation"
-}}"""
+{json.dumps({k: recommendation[k] for k in ("from_platform", "to_platform", "amount_to_shift", "projected_additional_leads")}, indent=2)}
+
+Explain to the agent in one or two plain sentences why this shift makes sense.
+Do not change or second-guess the numbers."""
 
 
 # ── CORE AI FUNCTIONS ─────────────────────────────────────────────────────────
@@ -138,29 +217,32 @@ async def qualify_lead(
     messages.append({"role": "user", "content": incoming_message})
 
     try:
-        response = await client.chat.completions.create(
+        # JSON-schema structured output: the score update comes back as typed
+        # fields instead of a tail block the model has to spell out and we split off
+        response = await _get_client().beta.chat.completions.parse(
             model=MODEL,
             messages=messages,
-            max_tokens=400,
+            max_tokens=500,
             temperature=0.7,
+            response_format=QualificationUpdate,
         )
 
-        full_response = response.choices[0].message.content
+        message = response.choices[0].message
         prompt_tokens = response.usage.prompt_tokens
         completion_tokens = response.usage.completion_tokens
-
-        # Parse the hidden score update block
-        score_data = None
-        display_response = full_response
-
-        if "[SCORE_UPDATE:" in full_response:
-            parts = full_response.split("[SCORE_UPDATE:")
-            display_response = parts[0].strip()
-            try:
-                score_json = parts[1].rstrip("]").strip()
-                score_data = json.loads(score_json)
-            except (json.JSONDecodeError, IndexError) as e:
-                logger.warning(f"Failed to parse score update: {e}")
+        if response.usage.prompt_tokens_details:
+            logger.debug(f"qualify_lead cached prompt tokens: {response.usage.prompt_tokens_details.cached_tokens}/{prompt_tokens}")
+
+        update = message.parsed
+        if update is None:
+            # Never forward a refusal (or nothing) to the lead
+            logger.warning(f"No structured qualification update for lead {lead.id}, refusal: {message.refusal!r}")
+            display_response = QUALIFY_FALLBACK_RESPONSE.format(agent_name=agent.full_name)
+            score_data = None
+        else:
+            display_response = update.ai_response
+            score_data = update.model_dump(exclude={"ai_response"})
+            score_data["score"] = max(0, min(100, score_data["score"]))
 
         # Update lead in DB
         new_score = score_data.get("score", lead.ai_score) if score_data else lead.ai_score
@@ -201,10 +283,10 @@ async def generate_email(
     Generate a marketing email using GPT-4o.
     Types: newsletter, birthday, market_update, new_listing, reengagement, follow_up
     """
-    system_prompt = build_email_generation_prompt(prompt, agent, email_type)
+    system_prompt = build_email_generation_prompt(agent, email_type)
 
     try:
-        response = await client.chat.completions.create(
+        response = await _get_client().chat.completions.create(
             model=MODEL,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -263,7 +345,7 @@ Format as JSON array:
 Make each email feel personal, valuable, and build trust. Use [First Name] placeholder."""
 
     try:
-        response = await client.chat.completions.create(
+        response = await _get_client().chat.completions.create(
             model=MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=3000,
@@ -271,7 +353,7 @@ Make each email feel personal, valuable, and build trust. Use [First Name] place
             response_format={"type": "json_object"},
         )
 
-        data = json.loads(response.choices[0].message.content)
+        data = orjson.loads(response.choices[0].message.content)
         emails = data.get("emails", data) if isinstance(data, dict) else data
         return emails if isinstance(emails, list) else []
 
@@ -305,33 +387,152 @@ Length: 300-400 words."""
     return await generate_email(prompt, "monthly market newsletter", agent)
 
 
+def optimize_ad_budget_greedy(platforms_data: list[dict]) -> dict:
+    """
+    Deterministic budget reallocation: rank platforms by cost per lead and
+    shift part of the least efficient platform's budget to the most efficient.
+    Platforms that spent without producing a lead rank last.
+    """
+    ranked = sorted(
+        (p for p in platforms_data if p.get("spend")),
+        key=lambda p: p["spend"] / p["leads"] if p.get("leads") else float("inf"),
+    )
+    if len(ranked) < 2 or not ranked[0].get("leads"):
+        return {
+            "recommendation": "Keep the current allocation until at least two platforms have lead data",
+            "from_platform": None,
+            "to_platform": None,
+            "amount_to_shift": 0,
+            "projected_additional_leads": 0,
+            "reasoning": "Not enough spend and lead history to compare platforms.",
+        }
+
+    best, worst = ranked[0], ranked[-1]
+    best_cpl = best["spend"] / best["leads"]
+    worst_cpl = worst["spend"] / worst["leads"] if worst.get("leads") else float("inf")
+    amount = int((worst.get("monthly_budget") or 0) * AD_OPTIMIZER_MAX_SHIFT_FRACTION) // 10 * 10
+    if amount <= 0 or best_cpl >= worst_cpl:
+        return {
+            "recommendation": "Keep the current allocation",
+            "from_platform": None,
+            "to_platform": None,
+            "amount_to_shift": 0,
+            "projected_additional_leads": 0,
+            "reasoning": "No platform has a meaningfully lower cost per lead with budget to move.",
+        }
+
+    lost_leads = amount / worst_cpl if worst_cpl != float("inf") else 0
+    projected = max(0, round(amount / best_cpl - lost_leads))
+    return {
+        "recommendation": f"Shift ${amount} per month from {worst['platform']} to {best['platform']}",
+        "from_platform": worst["platform"],
+        "to_platform": best["platform"],
+        "amount_to_shift": amount,
+        "projected_additional_leads": projected,
+        "reasoning": (
+            f"{best['platform']} is producing leads at ${best_cpl:,.2f} each versus "
+            + (f"${worst_cpl:,.2f}" if worst_cpl != float("inf") else "no leads")
+            + f" on {worst['platform']}."
+        ),
+    }
+
+
 async def optimize_ad_budget(platforms_data: list[dict]) -> dict:
     """
-    AI analyzes all platform performance and recommends budget reallocation.
+    Recommend a budget reallocation across platforms.
+    The numbers always come from the greedy solver; with AD_OPTIMIZER_LLM_EXPLANATIONS
+    on, GPT rewrites the reasoning text for the already-decided shift.
     """
-    prompt = build_ad_optimization_prompt(platforms_data)
+    recommendation = optimize_ad_budget_greedy(platforms_data)
+    if not AD_OPTIMIZER_LLM_EXPLANATIONS or not recommendation["amount_to_shift"]:
+        return recommendation
+
+    prompt = build_ad_optimization_prompt(platforms_data, recommendation)
 
     try:
-        response = await client.chat.completions.create(
+        response = await _cached_completion(
             model=MODEL,
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=400,
+            max_tokens=150,
             temperature=0.3,
-            response_format={"type": "json_object"},
         )
-
-        return json.loads(response.choices[0].message.content)
-
+        recommendation["reasoning"] = response.choices[0].message.content.strip()
     except Exception as e:
-        logger.error(f"OpenAI ad optimization error: {e}")
-        raise
-
-
-async def score_lead_from_profile(lead: Lead) -> int:
+        logger.error(f"OpenAI ad optimization explanation error: {e}")
+
+    return recommendation
+
+
+_TIMELINE_NOW_WORDS = r"(?:asap|now|immediate(?:ly)?|this month)"
+# Whole words only: "now" must not fire inside "unknown"
+_TIMELINE_NOW = re.compile(rf"\b{_TIMELINE_NOW_WORDS}\b")
+# "not now", "not right now", "no, not immediately" say nothing about when
+_TIMELINE_NEGATED_NOW = re.compile(rf"\b(?:not|no|never)\s+(?:right\s+)?{_TIMELINE_NOW_WORDS}\b")
+_TIMELINE_NUMBER = re.compile(r"\d+")
+
+
+def _timeline_months(timeline: Optional[str]) -> Optional[int]:
+    """Upper bound of a free-text timeline in months ("1-2 months" -> 2), None if unreadable"""
+    if not timeline:
+        return None
+    text = timeline.lower()
+    if _TIMELINE_NOW.search(_TIMELINE_NEGATED_NOW.sub(" ", text)):
+        return 0
+    numbers = _TIMELINE_NUMBER.findall(text)
+    if not numbers:
+        return None
+    months = max(int(n) for n in numbers)
+    if "year" in text or "yr" in text:
+        months *= 12
+    elif "week" in text:
+        months = 0
+    return months
+
+
+def score_lead_profile_rules(lead: Lead) -> int:
+    """
+    Deterministic 0-100 profile score, following the same guide the LLM scorer uses:
+    80-100 financed + short timeline + clear intent, 0-39 early research.
+    """
+    score = 10
+    if lead.is_cash_buyer:
+        score += 40
+    elif lead.is_pre_approved:
+        score += 30
+
+    months = _timeline_months(lead.timeline)
+    if months is not None:
+        if months <= 2:
+            score += 25
+        elif months <= 5:
+            score += 15
+        elif months <= 12:
+            score += 5
+
+    urgency = (lead.urgency_level or "").lower()
+    if urgency == "high":
+        score += 15
+    elif urgency == "medium":
+        score += 8
+
+    if lead.budget_max:
+        score += 10
+    if lead.intent:
+        score += 5
+    if lead.current_situation and "selling" in lead.current_situation.lower():
+        score += 5
+    return max(0, min(100, score))
+
+
+async def score_lead_from_profile(lead: Lead, use_llm: bool = False) -> int:
     """
     Score a lead 0-100 based on their profile data alone (no conversation).
-    Used for leads imported manually or from ad platforms.
+    Used for leads imported manually or from ad platforms. The rule-based score
+    is the default; use_llm=True asks GPT-4o instead.
     """
+    if not use_llm:
+        return score_lead_profile_rules(lead)
+
     prompt = f"""Score this real estate lead from 0-100 based on buying readiness.
 
 Lead profile:
@@ -352,7 +553,7 @@ Scoring guide:
 Respond with just the number."""
 
     try:
-        response = await client.chat.completions.create(
+        response = await _cached_completion(
             model=MODEL,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=10,
@@ -361,7 +562,7 @@ Respond with just the number."""
         score_text = response.choices[0].message.content.strip()
         return min(100, max(0, int(''.join(filter(str.isdigit, score_text)))))
     except Exception:
-        return 25  # Default score if AI fails
+        return score_lead_profile_rules(lead)
 
 
 async def generate_birthday_email(lead: Lead, agent: Agent) -> dict:
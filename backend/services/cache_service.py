@@ -0,0 +1,204 @@
+"""
+Cache Service
+─────────────
+- Redis-backed response cache for idempotent GET endpoints
+- Tenant-scoped namespaces (one per agent) with O(1) invalidation
+- Degrades to a no-op when REDIS_URL is unset or Redis is unreachable
+"""
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Optional
+import redis.asyncio as redis
+import functools
+import hashlib
+import orjson
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL")
+CACHE_PREFIX = "rb"
+
+redis_client = redis.from_url(REDIS_URL) if REDIS_URL else None
+
+
+# ── LOW-LEVEL HELPERS ─────────────────────────────────────────────────────────
+
+async def _get_raw(key: str) -> Optional[bytes]:
+    try:
+        return await redis_client.get(key)
+    except Exception as e:
+        logger.warning(f"Redis get failed for {key}: {e}")
+        return None
+
+
+async def _set_raw(key: str, raw: bytes, ttl: int):
+    try:
+        await redis_client.set(key, raw, ex=ttl)
+    except Exception as e:
+        logger.warning(f"Redis set failed for {key}: {e}")
+
+
+def _dumps(value: Any) -> bytes:
+    return orjson.dumps(value, default=jsonable_encoder)
+
+
+async def cache_get(key: str) -> Optional[Any]:
+    if redis_client is None:
+        return None
+    raw = await _get_raw(key)
+    return orjson.loads(raw) if raw is not None else None
+
+
+async def cache_set(key: str, value: Any, ttl: int):
+    if redis_client is None:
+        return
+    await _set_raw(key, _dumps(value), ttl)
+
+
+async def cache_delete(*keys: str):
+    if redis_client is None or not keys:
+        return
+    try:
+        await redis_client.delete(*keys)
+    except Exception as e:
+        logger.warning(f"Redis delete failed for {keys}: {e}")
+
+
+async def claim_once(key: str, ttl: int) -> bool:
+    """
+    SET NX: True the first time a key is claimed within ttl, False on repeats.
+    Without Redis every claim succeeds (callers need their own DB-level guard).
+    """
+    if redis_client is None:
+        return True
+    try:
+        return bool(await redis_client.set(key, b"1", nx=True, ex=ttl))
+    except Exception as e:
+        logger.warning(f"Redis claim failed for {key}: {e}")
+        return True
+
+
+async def queue_push(key: str, value: Any, ttl: int) -> bool:
+    """
+    Append a JSON value to a Redis list, refreshing its TTL.
+    False when Redis is unset or unreachable, so callers can act immediately.
+    """
+    if redis_client is None:
+        return False
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            await pipe.rpush(key, _dumps(value)).expire(key, ttl).execute()
+        return True
+    except Exception as e:
+        logger.warning(f"Redis push failed for {key}: {e}")
+        return False
+
+
+async def queue_drain(key: str) -> list:
+    """Atomically take every value queued under key (oldest first)"""
+    if redis_client is None:
+        return []
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            raw, _ = await pipe.lrange(key, 0, -1).delete(key).execute()
+        return [orjson.loads(item) for item in raw]
+    except Exception as e:
+        logger.warning(f"Redis drain failed for {key}: {e}")
+        return []
+
+
+async def schedule_due(key: str, member: str, due_at: float) -> bool:
+    """
+    Add member to a sorted set of due times, keeping an earlier due time if it
+    is already scheduled. False when Redis is unset or unreachable.
+    """
+    if redis_client is None:
+        return False
+    try:
+        await redis_client.zadd(key, {member: due_at}, nx=True)
+        return True
+    except Exception as e:
+        logger.warning(f"Redis schedule failed for {key}: {e}")
+        return False
+
+
+async def take_due(key: str, now: float) -> list[str]:
+    """
+    Remove and return members due by now. ZREM decides ownership, so each
+    member goes to exactly one caller even with several processes polling.
+    """
+    if redis_client is None:
+        return []
+    try:
+        taken = []
+        for member in await redis_client.zrangebyscore(key, "-inf", now):
+            if await redis_client.zrem(key, member):
+                taken.append(member.decode())
+        return taken
+    except Exception as e:
+        logger.warning(f"Redis take failed for {key}: {e}")
+        return []
+
+
+async def _agent_namespace(agent_id) -> str:
+    """
+    Each agent's cached responses live under a version number.
+    Bumping the version orphans every older entry (they age out via TTL),
+    so invalidation never has to SCAN for keys.
+    """
+    version = await redis_client.get(f"{CACHE_PREFIX}:agent:{agent_id}:v")
+    return f"{CACHE_PREFIX}:agent:{agent_id}:{int(version or 0)}"
+
+
+async def invalidate_agent_responses(agent_id):
+    """Drop all cached responses for an agent (call after any write)"""
+    if redis_client is None:
+        return
+    try:
+        await redis_client.incr(f"{CACHE_PREFIX}:agent:{agent_id}:v")
+    except Exception as e:
+        logger.warning(f"Redis invalidation failed for agent {agent_id}: {e}")
+
+
+# ── ENDPOINT DECORATOR ────────────────────────────────────────────────────────
+
+def cached(expire: int = 60):
+    """
+    Cache a GET endpoint's JSON-able return value per agent.
+    The endpoint must take the authenticated agent as an `agent` parameter;
+    remaining non-session parameters (path/query values) form the cache key.
+    With Redis up, responses are returned as pre-serialized JSON bytes.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            agent = kwargs.get("agent")
+            if redis_client is None or agent is None:
+                return await func(*args, **kwargs)
+
+            params = sorted(
+                (k, str(v)) for k, v in kwargs.items()
+                if k != "agent" and not isinstance(v, AsyncSession)
+            )
+            digest = hashlib.sha256(repr(params).encode()).hexdigest()[:16]
+            try:
+                key = f"{await _agent_namespace(agent.id)}:{func.__module__}.{func.__name__}:{digest}"
+            except Exception as e:
+                logger.warning(f"Redis unavailable, serving uncached: {e}")
+                return await func(*args, **kwargs)
+
+            # Cached bodies are already JSON: serve the bytes as-is, with no
+            # parse / jsonable_encoder / re-serialize round trip
+            hit = await _get_raw(key)
+            if hit is not None:
+                return Response(content=hit, media_type="application/json")
+
+            body = _dumps(await func(*args, **kwargs))
+            await _set_raw(key, body, expire)
+            return Response(content=body, media_type="application/json")
+        return wrapper
+    return decorator
@@ -0,0 +1,42 @@
+"""
+HTTP Service
+────────────
+- One shared httpx.AsyncClient for outbound platform APIs (Meta, Google, Twilio, SendGrid, ...)
+- Keep-alive pooling + HTTP/2 so repeat calls skip the TCP/TLS handshake
+- Opened and closed by the app lifespan; lazily created if used before startup
+"""
+
+from typing import Optional
+import httpx
+import logging
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = httpx.Timeout(15.0, connect=5.0)
+# httpx drops idle connections after 5s by default; alert and ad traffic is
+# bursty, so keep them for a minute to carry warm TLS sessions across lulls
+HTTP_KEEPALIVE_EXPIRY = 60.0
+HTTP_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=50, keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+)
+# Platform insight responses are large, repetitive JSON — always ask for compression
+HTTP_HEADERS = {"Accept-Encoding": "gzip, deflate"}
+
+_http: Optional[httpx.AsyncClient] = None
+
+
+def get_http() -> httpx.AsyncClient:
+    """Shared client — do not close it or use it as a context manager"""
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(
+            http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT, headers=HTTP_HEADERS,
+        )
+    return _http
+
+
+async def close_http():
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
@@ -5,68 +5,243 @@ Notification Service
 - Instant agent-lead call connect (Twilio Programmable Voice)
 - SendGrid transactional emails
 - Daily digest scheduling
+
+Both vendors are called through their REST APIs on the shared keep-alive
+httpx client, so sends are awaited natively. The SDKs' transports block
+the event loop, and SendGrid's opens a new TLS connection per send.
 """
 
-from twilio.rest import Client as TwilioClient
-from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Mail
+from services.http_service import get_http
+from services.cache_service import CACHE_PREFIX, claim_once, queue_drain, queue_push, schedule_due, take_due
+from models.database import Agent, AsyncSessionLocal
 from typing import Optional
+from uuid import UUID
+from string import Template
+from html import escape
+from urllib.parse import urlencode
+import asyncio
+import hashlib
+import re
+import time
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
-twilio_client = TwilioClient(
-    os.getenv("TWILIO_ACCOUNT_SID"),
-    os.getenv("TWILIO_AUTH_TOKEN"),
-)
+TWILIO_ACCOUNT_SID = os.getenv("TWILIO_ACCOUNT_SID")
+TWILIO_AUTH_TOKEN = os.getenv("TWILIO_AUTH_TOKEN")
+TWILIO_API_URL = f"https://api.twilio.com/2010-04-01/Accounts/{TWILIO_ACCOUNT_SID}"
 TWILIO_FROM_NUMBER = os.getenv("TWILIO_FROM_NUMBER", "+18435550100")
 TWILIO_CONNECT_NUMBER = os.getenv("TWILIO_CONNECT_NUMBER", "+18435550101")
+API_BASE_URL = os.getenv("API_BASE_URL", "https://api.realboost.ai")
+TWIML_CONNECT_URL = f"{API_BASE_URL}/api/webhooks/twiml/connect"
+# Twilio connection overrides: 3s connect / 8s read, up to 3 retries on
+# connect failures or 5xx, so a slow TwiML fetch is retried by Twilio itself
+TWIML_CONNECT_OVERRIDES = "ct=3000&rt=8000&rc=3&rp=ct,5xx"
 
-sg_client = SendGridAPIClient(os.getenv("SENDGRID_API_KEY"))
+SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
+SENDGRID_SEND_URL = "https://api.sendgrid.com/v3/mail/send"
+# Caps on in-flight requests per vendor so a burst of alerts stays under rate limits
+SENDGRID_MAX_CONCURRENCY = 20
+TWILIO_MAX_CONCURRENCY = 10
+# A 429 is retried after its Retry-After (capped), at most this many times
+RATE_LIMIT_RETRIES = 2
+RATE_LIMIT_MAX_WAIT_SECONDS = 10.0
 FROM_EMAIL = os.getenv("FROM_EMAIL", "alerts@realboost.ai")
 FROM_NAME = "RealBoost AI"
 
+# A lead alerts at most once per bucket; the claim outlives it
+ALERT_DEDUPE_BUCKET_SECONDS = 300
+ALERT_DEDUPE_TTL_SECONDS = 900
+# An agent's first hot lead alerts immediately; more arriving within this
+# window are queued in Redis and sent together as one SMS / one email
+ALERT_COALESCE_SECONDS = 45
+# Queued alerts are delivered by a periodic flush in every worker process, so
+# a batch survives the death of the request that queued it
+ALERT_FLUSH_INTERVAL_SECONDS = 5
+ALERT_PENDING_TTL_SECONDS = ALERT_COALESCE_SECONDS * 10
+ALERT_DUE_KEY = f"{CACHE_PREFIX}:alerts:due"
+
+
+_twilio_slots = asyncio.Semaphore(TWILIO_MAX_CONCURRENCY)
+_sendgrid_slots = asyncio.Semaphore(SENDGRID_MAX_CONCURRENCY)
+
+
+def _retry_after(resp) -> float:
+    try:
+        return min(float(resp.headers.get("Retry-After", 1)), RATE_LIMIT_MAX_WAIT_SECONDS)
+    except ValueError:
+        return 1.0
+
+
+async def _vendor_post(slots: asyncio.Semaphore, url: str, **kwargs):
+    """
+    POST to a vendor API within its concurrency cap; raises on non-2xx.
+    A 429 means the request was rejected unprocessed, so it is safe to
+    wait out Retry-After (outside the cap) and send it again.
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        async with slots:
+            resp = await get_http().post(url, **kwargs)
+        if resp.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            break
+        wait = _retry_after(resp)
+        logger.warning("Rate limited by %s, retrying in %.1fs", resp.url.host, wait)
+        await asyncio.sleep(wait)
+    resp.raise_for_status()
+    return resp
+
+
+async def _twilio_create(resource: str, **params) -> dict:
+    """POST a form to a Twilio REST resource (Messages, Calls)"""
+    resp = await _vendor_post(
+        _twilio_slots,
+        f"{TWILIO_API_URL}/{resource}.json",
+        data=params,
+        auth=(TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN),
+    )
+    return resp.json()
+
+
+async def _sendgrid_send(message: Mail):
+    """POST a Mail to SendGrid over the pooled connection"""
+    return await _vendor_post(
+        _sendgrid_slots,
+        SENDGRID_SEND_URL,
+        json=message.get(),
+        headers={"Authorization": f"Bearer {SENDGRID_API_KEY}"},
+    )
+
+
+async def _claim_alert(lead_id) -> bool:
+    """
+    Re-qualifying an already-hot lead, or a retried background task, would
+    otherwise alert the agent again. SET NX on (lead, 5-min bucket) lets the
+    first attempt through, covering both channels since an alert may be sent
+    as part of a coalesced batch; without Redis every claim succeeds.
+    """
+    bucket = int(time.time() // ALERT_DEDUPE_BUCKET_SECONDS)
+    key = hashlib.blake2b(f"{lead_id}|{bucket}".encode(), digest_size=16).hexdigest()
+    return await claim_once(f"{CACHE_PREFIX}:alert:{key}", ALERT_DEDUPE_TTL_SECONDS)
+
+
+def _hot_lead_summary(lead, key_findings: Optional[list[str]]) -> dict:
+    """The JSON-able lead fields an alert needs, so it can wait in Redis"""
+    return {
+        "lead_id": str(lead.id),
+        "lead_name": lead.full_name,
+        "lead_phone": lead.phone,
+        "lead_email": lead.email,
+        "budget": lead.budget_display,
+        "score": lead.ai_score,
+        "findings": " · ".join(key_findings or []) or "High engagement, motivated buyer",
+    }
+
 
 async def send_hot_lead_alert(agent, lead, key_findings: list[str] = None):
     """
-    Fire all hot lead alerts simultaneously:
-    1. SMS to agent
-    2. Email to agent
-    3. Optional: initiate call connect (Twilio)
+    Alert the agent about a hot lead by SMS and email.
+    The first hot lead goes out immediately and opens a coalescing window. Any
+    more for the same agent while it is open are queued in Redis and sent as one
+    consolidated SMS and email by flush_due_alerts once the window has passed.
+    Without Redis every alert is sent on its own.
     """
-    lead_name = f"{lead.first_name} {lead.last_name or ''}".strip()
-    budget = f"${lead.budget_max:,}" if lead.budget_max else "Unknown"
-    findings_text = " · ".join(key_findings or []) or "High engagement, motivated buyer"
+    if not await _claim_alert(lead.id):
+        return
+
+    alert = _hot_lead_summary(lead, key_findings)
+    window_key = f"{CACHE_PREFIX}:alerts:window:{agent.id}"
+    if await claim_once(window_key, ALERT_COALESCE_SECONDS):
+        await _send_alerts(agent, [alert])
+        return
+
+    if not (
+        await queue_push(_pending_alerts_key(agent.id), alert, ALERT_PENDING_TTL_SECONDS)
+        and await schedule_due(ALERT_DUE_KEY, str(agent.id), time.time() + ALERT_COALESCE_SECONDS)
+    ):
+        await _send_alerts(agent, [alert])
+
+
+def _pending_alerts_key(agent_id) -> str:
+    return f"{CACHE_PREFIX}:alerts:pending:{agent_id}"
+
+
+async def flush_due_alerts():
+    """Send every agent's queued alerts whose coalescing window has passed"""
+    for agent_id in await take_due(ALERT_DUE_KEY, time.time()):
+        alerts = await queue_drain(_pending_alerts_key(agent_id))
+        if not alerts:
+            continue
+        async with AsyncSessionLocal() as db:
+            agent = await db.get(Agent, UUID(agent_id))
+        if agent is None:
+            continue
+        await _send_alerts(agent, alerts)
+
+
+async def _alert_flusher():
+    while True:
+        try:
+            await flush_due_alerts()
+        except Exception as e:
+            logger.error("Hot lead alert flush failed: %s", e)
+        await asyncio.sleep(ALERT_FLUSH_INTERVAL_SECONDS)
+
+
+_alert_flusher_task: Optional[asyncio.Task] = None
+
+
+async def start_alert_flusher():
+    global _alert_flusher_task
+    _alert_flusher_task = asyncio.create_task(_alert_flusher(), name="hot-lead-alert-flusher")
+
+
+async def stop_alert_flusher():
+    global _alert_flusher_task
+    if _alert_flusher_task is None:
+        return
+    _alert_flusher_task.cancel()
+    await asyncio.gather(_alert_flusher_task, return_exceptions=True)
+    _alert_flusher_task = None
+
+
+async def _send_alerts(agent, alerts: list[dict]):
+    """Send one lead's alert as-is, or several as a single consolidated SMS and email"""
+    sends = []
+    single = alerts[0] if len(alerts) == 1 else None
 
     # SMS Alert
     if agent.notify_hot_lead_sms and agent.phone:
-        await send_hot_lead_sms(
-            to=agent.phone,
-            agent_name=agent.full_name,
-            lead_name=lead_name,
-            lead_phone=lead.phone,
-            lead_email=lead.email,
-            budget=budget,
-            score=lead.ai_score,
-            findings=findings_text,
-        )
+        if single:
+            sends.append(send_hot_lead_sms(
+                to=agent.phone,
+                agent_name=agent.full_name,
+                lead_name=single["lead_name"],
+                lead_phone=single["lead_phone"],
+                lead_email=single["lead_email"],
+                budget=single["budget"],
+                score=single["score"],
+                findings=single["findings"],
+            ))
+        else:
+            sends.append(send_hot_leads_batch_sms(to=agent.phone, alerts=alerts))
 
     # Email Alert
     if agent.notify_hot_lead_email and agent.email:
-        await send_hot_lead_email(
-            to=agent.email,
-            agent_name=agent.full_name,
-            lead_name=lead_name,
-            lead_phone=lead.phone,
-            lead_email=lead.email,
-            budget=budget,
-            score=lead.ai_score,
-            findings=findings_text,
-            lead_id=str(lead.id),
-        )
+        if single:
+            sends.append(send_hot_lead_email(to=agent.email, agent_name=agent.full_name, **single))
+        else:
+            sends.append(send_hot_leads_batch_email(to=agent.email, alerts=alerts))
+
+    # Channels hit different vendors, so they overlap; a failure in one
+    # (including anything escaping its own handler) never cancels the other
+    results = await asyncio.gather(*sends, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Hot lead alert channel failed for agent %s: %s", agent.id, result)
 
-    logger.info(f"Hot lead alerts sent for {lead_name} → {agent.email}")
+    logger.info("Hot lead alerts sent for %d lead(s) → %s", len(alerts), agent.email)
 
 
 async def send_hot_lead_sms(
@@ -92,30 +267,19 @@ async def send_hot_lead_sms(
     )
 
     try:
-        twilio_client.messages.create(
-            body=message,
-            from_=TWILIO_FROM_NUMBER,
-            to=to,
+        await _twilio_create(
+            "Messages",
+            Body=message,
+            From=TWILIO_FROM_NUMBER,
+            To=to,
         )
-        logger.info(f"Hot lead SMS sent to {to}")
+        logger.info("Hot lead SMS sent to %s", to)
     except Exception as e:
-        logger.error(f"Twilio SMS failed: {e}")
+        logger.error("Twilio SMS failed: %s", e)
 
 
-async def send_hot_lead_email(
-    to: str,
-    agent_name: str,
-    lead_name: str,
-    lead_phone: Optional[str],
-    lead_email: Optional[str],
-    budget: str,
-    score: int,
-    findings: str,
-    lead_id: str,
-):
-    """Send HTML hot lead email to agent via SendGrid"""
-    html_content = f"""
-<!DOCTYPE html>
+# Built once at import; values are HTML-escaped before substitution
+_HOT_LEAD_HTML = """<!DOCTYPE html>
 <html>
 <head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1"></head>
 <body style="font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', sans-serif; background: #f9fafb; margin: 0; padding: 20px;">
@@ -125,32 +289,32 @@ async def send_hot_lead_email(
     <div style="background: linear-gradient(135deg, #ef4444, #dc2626); padding: 30px; text-align: center;">
       <div style="font-size: 40px; margin-bottom: 8px;">🔥</div>
       <h1 style="color: white; margin: 0; font-size: 24px; font-weight: 800;">HOT LEAD ALERT</h1>
-      <p style="color: rgba(255,255,255,0.85); margin: 8px 0 0; font-size: 14px;">AI Lead Score: {score}/100 — Call within 5 minutes for best results</p>
+      <p style="color: rgba(255,255,255,0.85); margin: 8px 0 0; font-size: 14px;">AI Lead Score: $score/100 — Call within 5 minutes for best results</p>
     </div>
 
     <!-- Lead Info -->
     <div style="padding: 30px;">
       <div style="background: #fef2f2; border: 1px solid #fecaca; border-radius: 12px; padding: 20px; margin-bottom: 24px;">
-        <h2 style="margin: 0 0 16px; font-size: 20px; color: #111;">{lead_name}</h2>
+        <h2 style="margin: 0 0 16px; font-size: 20px; color: #111;">$lead_name</h2>
         <table style="width: 100%; border-collapse: collapse;">
-          <tr><td style="padding: 6px 0; color: #6b7280; font-size: 14px; width: 120px;">📞 Phone</td><td style="padding: 6px 0; font-weight: 600; font-size: 14px;">{lead_phone or 'Not provided'}</td></tr>
-          <tr><td style="padding: 6px 0; color: #6b7280; font-size: 14px;">✉️ Email</td><td style="padding: 6px 0; font-weight: 600; font-size: 14px;">{lead_email or 'Not provided'}</td></tr>
-          <tr><td style="padding: 6px 0; color: #6b7280; font-size: 14px;">💰 Budget</td><td style="padding: 6px 0; font-weight: 600; font-size: 14px;">{budget}</td></tr>
-          <tr><td style="padding: 6px 0; color: #6b7280; font-size: 14px;">🎯 Score</td><td style="padding: 6px 0; font-weight: 600; font-size: 14px; color: #ef4444;">{score}/100</td></tr>
+          <tr><td style="padding: 6px 0; color: #6b7280; font-size: 14px; width: 120px;">📞 Phone</td><td style="padding: 6px 0; font-weight: 600; font-size: 14px;">$lead_phone_display</td></tr>
+          <tr><td style="padding: 6px 0; color: #6b7280; font-size: 14px;">✉️ Email</td><td style="padding: 6px 0; font-weight: 600; font-size: 14px;">$lead_email_display</td></tr>
+          <tr><td style="padding: 6px 0; color: #6b7280; font-size: 14px;">💰 Budget</td><td style="padding: 6px 0; font-weight: 600; font-size: 14px;">$budget</td></tr>
+          <tr><td style="padding: 6px 0; color: #6b7280; font-size: 14px;">🎯 Score</td><td style="padding: 6px 0; font-weight: 600; font-size: 14px; color: #ef4444;">$score/100</td></tr>
         </table>
       </div>
 
       <!-- AI Findings -->
       <div style="background: #f5f3ff; border: 1px solid #ddd6fe; border-radius: 12px; padding: 16px; margin-bottom: 24px;">
         <p style="margin: 0 0 6px; font-size: 12px; color: #7c3aed; font-weight: 700; text-transform: uppercase; letter-spacing: 0.5px;">🤖 AI Key Findings</p>
-        <p style="margin: 0; color: #4c1d95; font-size: 14px;">{findings}</p>
+        <p style="margin: 0; color: #4c1d95; font-size: 14px;">$findings</p>
       </div>
 
       <!-- CTA Buttons -->
       <div style="display: flex; gap: 12px; flex-wrap: wrap;">
-        <a href="tel:{lead_phone or ''}" style="display: inline-block; background: #16a34a; color: white; padding: 14px 24px; border-radius: 10px; text-decoration: none; font-weight: 700; font-size: 15px;">📞 Call Now</a>
-        <a href="https://app.realboost.ai/chat/{lead_id}" style="display: inline-block; background: #2563eb; color: white; padding: 14px 24px; border-radius: 10px; text-decoration: none; font-weight: 700; font-size: 15px;">💬 View Conversation</a>
-        <a href="sms:{lead_phone or ''}" style="display: inline-block; background: #7c3aed; color: white; padding: 14px 24px; border-radius: 10px; text-decoration: none; font-weight: 700; font-size: 15px;">✉️ Text Lead</a>
+        <a href="tel:$lead_phone" style="display: inline-block; background: #16a34a; color: white; padding: 14px 24px; border-radius: 10px; text-decoration: none; font-weight: 700; font-size: 15px;">📞 Call Now</a>
+        <a href="https://app.realboost.ai/chat/$lead_id" style="display: inline-block; background: #2563eb; color: white; padding: 14px 24px; border-radius: 10px; text-decoration: none; font-weight: 700; font-size: 15px;">💬 View Conversation</a>
+        <a href="sms:$lead_phone" style="display: inline-block; background: #7c3aed; color: white; padding: 14px 24px; border-radius: 10px; text-decoration: none; font-weight: 700; font-size: 15px;">✉️ Text Lead</a>
       </div>
     </div>
 
@@ -161,6 +325,37 @@ async def send_hot_lead_email(
   </div>
 </body>
 </html>"""
+# Only the header → CTA section has placeholders; the document head and the
+# footer are static and concatenated as-is instead of being re-scanned per send
+_hot_body_start = _HOT_LEAD_HTML.index("    <!-- Header -->")
+_hot_body_end = _HOT_LEAD_HTML.index("    <!-- Footer -->")
+_HOT_LEAD_HEAD = _HOT_LEAD_HTML[:_hot_body_start]
+_HOT_LEAD_BODY = Template(_HOT_LEAD_HTML[_hot_body_start:_hot_body_end])
+_HOT_LEAD_FOOT = _HOT_LEAD_HTML[_hot_body_end:]
+
+
+async def send_hot_lead_email(
+    to: str,
+    agent_name: str,
+    lead_name: str,
+    lead_phone: Optional[str],
+    lead_email: Optional[str],
+    budget: str,
+    score: int,
+    findings: str,
+    lead_id: str,
+):
+    """Send HTML hot lead email to agent via SendGrid"""
+    html_content = _HOT_LEAD_HEAD + _HOT_LEAD_BODY.substitute(
+        score=score,
+        lead_name=escape(lead_name),
+        lead_phone_display=escape(lead_phone or "Not provided"),
+        lead_email_display=escape(lead_email or "Not provided"),
+        budget=escape(budget),
+        findings=escape(findings),
+        lead_phone=escape(lead_phone or ""),
+        lead_id=escape(lead_id),
+    ) + _HOT_LEAD_FOOT
 
     try:
         message = Mail(
@@ -169,10 +364,66 @@ async def send_hot_lead_email(
             subject=f"🔥 HOT LEAD: {lead_name} — {budget} budget — Call Now",
             html_content=html_content,
         )
-        sg_client.send(message)
-        logger.info(f"Hot lead email sent to {to}")
+        await _sendgrid_send(message)
+        logger.info("Hot lead email sent to %s", to)
+    except Exception as e:
+        logger.error("SendGrid email failed: %s", e)
+
+
+_HOT_LEADS_BATCH_EMAIL = Template("""<div style="font-family: sans-serif; max-width: 600px; margin: 0 auto;">
+  <h2>🔥 $count Hot Leads — Call within 5 minutes</h2>
+  <table style="width:100%; border-collapse: collapse;">
+$rows
+  </table>
+  <br>
+  <a href="https://app.realboost.ai" style="background:#2563eb;color:white;padding:12px 24px;border-radius:8px;text-decoration:none;font-weight:bold;">View Leads →</a>
+</div>""")
+_HOT_LEADS_BATCH_ROW = Template(
+    """    <tr><td style="padding:12px;"><a href="https://app.realboost.ai/chat/$lead_id">$lead_name</a></td>"""
+    """<td style="padding:12px;">$lead_phone</td><td style="padding:12px;">$budget</td>"""
+    """<td style="padding:12px;font-weight:bold;color:#ef4444;">$score/100</td></tr>"""
+)
+
+
+async def send_hot_leads_batch_sms(to: str, alerts: list[dict]):
+    """One SMS listing every hot lead from a coalesced burst"""
+    lines = [
+        f"{i}) {a['lead_name']} · {a['budget']} · 🎯 {a['score']} · 📞 {a['lead_phone'] or 'No phone'}"
+        for i, a in enumerate(alerts, 1)
+    ]
+    message = f"🔥 {len(alerts)} HOT LEADS — RealBoost AI\n\n" + "\n".join(lines) + "\n\nLog in to view conversations."
+
+    try:
+        await _twilio_create("Messages", Body=message, From=TWILIO_FROM_NUMBER, To=to)
+        logger.info("Hot leads batch SMS (%d) sent to %s", len(alerts), to)
+    except Exception as e:
+        logger.error("Twilio batch SMS failed: %s", e)
+
+
+async def send_hot_leads_batch_email(to: str, alerts: list[dict]):
+    """One email listing every hot lead from a coalesced burst"""
+    rows = "\n".join(
+        _HOT_LEADS_BATCH_ROW.substitute(
+            lead_id=escape(a["lead_id"]),
+            lead_name=escape(a["lead_name"]),
+            lead_phone=escape(a["lead_phone"] or "Not provided"),
+            budget=escape(a["budget"]),
+            score=a["score"],
+        )
+        for a in alerts
+    )
+
+    try:
+        message = Mail(
+            from_email=(FROM_EMAIL, FROM_NAME),
+            to_emails=to,
+            subject=f"🔥 {len(alerts)} HOT LEADS — Call Now",
+            html_content=_HOT_LEADS_BATCH_EMAIL.substitute(count=len(alerts), rows=rows),
+        )
+        await _sendgrid_send(message)
+        logger.info("Hot leads batch email (%d) sent to %s", len(alerts), to)
     except Exception as e:
-        logger.error(f"SendGrid email failed: {e}")
+        logger.error("SendGrid batch email failed: %s", e)
 
 
 async def initiate_call_connect(agent_phone: str, lead_phone: str, lead_name: str):
@@ -181,21 +432,37 @@ async def initiate_call_connect(agent_phone: str, lead_phone: str, lead_name: st
     Agent hears: "You have a hot lead — {name} — connecting now"
     """
     try:
-        # TwiML for the call bridge
-        twiml_url = f"{os.getenv('API_BASE_URL', 'https://api.realboost.ai')}/api/webhooks/twiml/connect?lead_phone={lead_phone}&lead_name={lead_name}"
+        # TwiML for the call bridge; names with &, # or spaces must be encoded
+        query = urlencode({"lead_phone": lead_phone, "lead_name": lead_name})
+        twiml_url = f"{TWIML_CONNECT_URL}?{query}#{TWIML_CONNECT_OVERRIDES}"
 
-        call = twilio_client.calls.create(
-            url=twiml_url,
-            to=agent_phone,
-            from_=TWILIO_CONNECT_NUMBER,
+        call = await _twilio_create(
+            "Calls",
+            Url=twiml_url,
+            To=agent_phone,
+            From=TWILIO_CONNECT_NUMBER,
         )
-        logger.info(f"Call connect initiated: agent={agent_phone}, lead={lead_phone}, call_sid={call.sid}")
-        return {"call_sid": call.sid, "status": "initiated"}
+        logger.info("Call connect initiated: agent=%s, lead=%s, call_sid=%s", agent_phone, lead_phone, call["sid"])
+        return {"call_sid": call["sid"], "status": "initiated"}
     except Exception as e:
-        logger.error(f"Call connect failed: {e}")
+        logger.error("Call connect failed: %s", e)
         raise
 
 
+# Placeholders the email generator writes into drip bodies (see ai_service)
+_DRIP_PLACEHOLDER = re.compile(r"\[(First Name|Agent Name|Agent Phone|Agent Website)\]")
+
+
+def _fill_placeholders(body: str, values: dict[str, str]) -> str:
+    """Single-pass substitution; placeholders without a value are left as written"""
+    return _DRIP_PLACEHOLDER.sub(lambda m: values.get(m.group(1), m.group(0)), body)
+
+
+def _drip_agent_values(agent_name: str, agent_phone: Optional[str], agent_website: Optional[str]) -> dict[str, str]:
+    values = {"Agent Name": agent_name, "Agent Phone": agent_phone, "Agent Website": agent_website}
+    return {k: v for k, v in values.items() if v}
+
+
 async def send_drip_email(
     to_email: str,
     to_name: str,
@@ -203,10 +470,14 @@ async def send_drip_email(
     html_body: str,
     from_agent_name: str,
     from_agent_email: str,
+    agent_phone: Optional[str] = None,
+    agent_website: Optional[str] = None,
 ):
     """Send a drip campaign email via SendGrid"""
     # Personalize the body
-    personalized_body = html_body.replace("[First Name]", to_name.split()[0])
+    values = _drip_agent_values(from_agent_name, agent_phone, agent_website)
+    values["First Name"] = (to_name.split() or [""])[0]
+    personalized_body = _fill_placeholders(html_body, values)
 
     try:
         message = Mail(
@@ -216,28 +487,36 @@ async def send_drip_email(
             html_content=personalized_body,
         )
         message.reply_to = from_agent_email
-        sg_client.send(message)
+        await _sendgrid_send(message)
         return True
     except Exception as e:
-        logger.error(f"Drip email send failed to {to_email}: {e}")
+        logger.error("Drip email send failed to %s: %s", to_email, e)
         return False
 
 
-async def send_daily_digest(agent, leads_summary: dict):
-    """Send daily lead digest to agent"""
-    html = f"""
-<div style="font-family: sans-serif; max-width: 600px; margin: 0 auto;">
+_DAILY_DIGEST_EMAIL = Template("""<div style="font-family: sans-serif; max-width: 600px; margin: 0 auto;">
   <h2>📊 Your Daily Lead Report</h2>
-  <p>Hi {agent.full_name.split()[0]}, here's your summary for today:</p>
+  <p>Hi $first_name, here's your summary for today:</p>
   <table style="width:100%; border-collapse: collapse;">
-    <tr style="background:#f3f4f6;"><td style="padding:12px;">Total Leads</td><td style="padding:12px;font-weight:bold;">{leads_summary.get('total', 0)}</td></tr>
-    <tr><td style="padding:12px;">Hot Leads 🔥</td><td style="padding:12px;font-weight:bold;color:#ef4444;">{leads_summary.get('hot', 0)}</td></tr>
-    <tr style="background:#f3f4f6;"><td style="padding:12px;">New Today</td><td style="padding:12px;font-weight:bold;">{leads_summary.get('new_today', 0)}</td></tr>
-    <tr><td style="padding:12px;">Ad Spend Today</td><td style="padding:12px;font-weight:bold;">${leads_summary.get('spend_today', 0):.2f}</td></tr>
+    <tr style="background:#f3f4f6;"><td style="padding:12px;">Total Leads</td><td style="padding:12px;font-weight:bold;">$total</td></tr>
+    <tr><td style="padding:12px;">Hot Leads 🔥</td><td style="padding:12px;font-weight:bold;color:#ef4444;">$hot</td></tr>
+    <tr style="background:#f3f4f6;"><td style="padding:12px;">New Today</td><td style="padding:12px;font-weight:bold;">$new_today</td></tr>
+    <tr><td style="padding:12px;">Ad Spend Today</td><td style="padding:12px;font-weight:bold;">$$$spend_today</td></tr>
   </table>
   <br>
   <a href="https://app.realboost.ai" style="background:#2563eb;color:white;padding:12px 24px;border-radius:8px;text-decoration:none;font-weight:bold;">View Dashboard →</a>
-</div>"""
+</div>""")
+
+
+async def send_daily_digest(agent, leads_summary: dict):
+    """Send daily lead digest to agent"""
+    html = _DAILY_DIGEST_EMAIL.substitute(
+        first_name=escape((agent.full_name.split() or [""])[0]),
+        total=leads_summary.get("total", 0),
+        hot=leads_summary.get("hot", 0),
+        new_today=leads_summary.get("new_today", 0),
+        spend_today=f"{leads_summary.get('spend_today', 0):.2f}",
+    )
 
     try:
         message = Mail(
@@ -246,6 +525,6 @@ async def send_daily_digest(agent, leads_summary: dict):
             subject=f"📊 Daily Report — {leads_summary.get('hot', 0)} hot leads today",
             html_content=html,
         )
-        sg_client.send(message)
+        await _sendgrid_send(message)
     except Exception as e:
-        logger.error(f"Daily digest failed for {agent.email}: {e}")
+        logger.error("Daily digest failed for %s: %s", agent.email, e)
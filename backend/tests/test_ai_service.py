@@ -0,0 +1,26 @@
+import pytest
+
+from services.ai_service import _timeline_months
+
+
+@pytest.mark.parametrize("timeline, months", [
+    (None, None),
+    ("", None),
+    ("Unknown", None),
+    ("ASAP", 0),
+    ("now", 0),
+    ("right now", 0),
+    ("immediately", 0),
+    ("this month", 0),
+    ("not now", None),
+    ("not right now", None),
+    ("not now, maybe 6 months", 6),
+    ("no rush, not immediately", None),
+    ("1-2 months", 2),
+    ("3 to 6 months", 6),
+    ("2 weeks", 0),
+    ("1 year", 12),
+    ("just browsing", None),
+])
+def test_timeline_months(timeline, months):
+    assert _timeline_months(timeline) == months